@@ -1,9 +1,10 @@
 from flask import Flask, jsonify
 from flask_migrate import Migrate
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
-from models import db, TokenBlocklist
-from views import auth_bp, user_bp, product_bp, order_bp, category_bp, cart_bp
+from models import db
+from serializers import init_serializers
+from views.auth import init_jwt
+from views import auth_bp, user_bp, product_bp, order_bp, category_bp, cart_bp, analytics_bp
 import os
 from flask_cors import CORS
 from datetime import timedelta
@@ -22,33 +23,31 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+app.config['STRICT_SERIALIZATION'] = os.getenv('STRICT_SERIALIZATION', 'false').lower() == 'true'
+app.config['CART_STORE'] = os.getenv('CART_STORE', 'db')
+app.config['CART_REDIS_URL'] = os.getenv('CART_REDIS_URL', 'redis://localhost:6379/0')
+app.config['CART_SUMMARY_TTL'] = float(os.getenv('CART_SUMMARY_TTL', '5'))
+app.config['REVOCATION_POLL_INTERVAL'] = float(os.getenv('REVOCATION_POLL_INTERVAL', '1'))
+app.config['REVOCATION_RESCAN_INTERVAL'] = float(os.getenv('REVOCATION_RESCAN_INTERVAL', '60'))
 
 
 db.init_app(app)
+init_serializers(app)
 migrate = Migrate(app, db)
 CORS(app, credentials=True)
 
 
-jwt = JWTManager(app)
+init_jwt(app)
 
 email(app)
 
-@jwt.token_in_blocklist_loader
-def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload['jti']
-    token = TokenBlocklist.query.filter_by(jti=jti).first()
-    return token is not None
-
-@jwt.revoked_token_loader
-def revoked_token_response(jwt_header, jwt_payload):
-    return jsonify({"error": "Token has been revoked, please login again."}), 401
-
 app.register_blueprint(auth_bp)
 app.register_blueprint(user_bp)
 app.register_blueprint(product_bp)
 app.register_blueprint(order_bp)
 app.register_blueprint(category_bp)
 app.register_blueprint(cart_bp)
+app.register_blueprint(analytics_bp)
 
 
 
@@ -0,0 +1,120 @@
+"""Concurrency benchmark for POST /orders/checkout.
+
+Creates throwaway ``bench_*`` customers whose carts all contain the same hot
+product, fires their checkouts from a thread pool and reports throughput and
+latency. A second round has every thread check out one shared cart, which
+must produce exactly one order. All bench rows, and their share of the sales
+rollups, are removed afterwards.
+
+Run against a Postgres DATABASE_URL for meaningful numbers (SQLite serializes
+writers):
+
+    python bench_checkout.py --customers 200 --workers 32
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token
+from app import app
+from models import db, User, Product, CartItem, Order, OrderItem, Invoice
+from views.analytics import apply_orders, orders_lines
+
+SHIPPING_INFO = {
+    "firstName": "Bench", "lastName": "User", "email": "bench@example.com",
+    "city": "Nairobi", "county": "Nairobi", "shipping": 200,
+}
+
+
+def create_customers(count, products, prefix="bench_"):
+    users = [
+        User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password_hash="x", role="customer")
+        for i in range(count)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    hot = products[0]
+    for i, user in enumerate(users):
+        db.session.add(CartItem(user_id=user.id, product_id=hot.id, quantity=1))
+        other = products[1 + i % (len(products) - 1)] if len(products) > 1 else None
+        if other is not None:
+            db.session.add(CartItem(user_id=user.id, product_id=other.id, quantity=2))
+    db.session.commit()
+    return [
+        {"Authorization": f"Bearer {create_access_token(identity={'id': user.id, 'role': 'customer'})}"}
+        for user in users
+    ]
+
+
+def checkout(headers):
+    client = app.test_client()
+    started = time.perf_counter()
+    response = client.post("/orders/checkout", json={"shipping_info": SHIPPING_INFO}, headers=headers)
+    return response.status_code, time.perf_counter() - started
+
+
+def run(label, requests, workers):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(checkout, requests))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"{label}: {len(results)} checkouts in {elapsed:.2f}s ({len(results) / elapsed:.1f}/s)")
+    print(f"  statuses {statuses}")
+    print(
+        f"  latency p50 {statistics.median(latencies) * 1000:.1f}ms"
+        f" p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms"
+        f" max {latencies[-1] * 1000:.1f}ms"
+    )
+    return statuses
+
+
+def cleanup():
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.username.like("bench\\_%", escape="\\"))]
+    if not user_ids:
+        return
+    order_ids = db.session.query(Order.id).filter(Order.user_id.in_(user_ids))
+    # Checkout added the orders to the sales rollups; take them back out
+    counted = [order_id for (order_id,) in order_ids.filter(Order.status != "cancelled")]
+    apply_orders(orders_lines(counted), -1)
+    OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Invoice.query.filter(Invoice.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.user_id.in_(user_ids)).delete(synchronize_session=False)
+    CartItem.query.filter(CartItem.user_id.in_(user_ids)).delete(synchronize_session=False)
+    User.query.filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    app.config["MAIL_SUPPRESS_SEND"] = True
+    with app.app_context():
+        products = Product.query.order_by(Product.id).limit(5).all()
+        if not products:
+            raise SystemExit("Seed some products first (python seed.py)")
+        cleanup()
+        try:
+            headers = create_customers(args.customers, products)
+            statuses = run("distinct carts, shared hot product", headers, args.workers)
+            orders = Order.query.join(User).filter(User.username.like("bench\\_%", escape="\\")).count()
+            print(f"  orders created {orders} (expected {args.customers})")
+
+            shared = create_customers(1, products, prefix="bench_shared_")[0]
+            statuses = run("one shared cart", [shared] * args.workers, args.workers)
+            print(f"  orders created {statuses.get(201, 0)} (expected 1)")
+        finally:
+            db.session.rollback()
+            cleanup()
+
+
+if __name__ == "__main__":
+    main()
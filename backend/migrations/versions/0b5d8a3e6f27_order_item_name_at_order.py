@@ -0,0 +1,32 @@
+"""order_items name_at_order
+
+Revision ID: 0b5d8a3e6f27
+Revises: 6e9b2f4c8d13
+Create Date: 2026-10-18 23:41:08.215764
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b5d8a3e6f27'
+down_revision = '6e9b2f4c8d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name_at_order', sa.String(length=120), nullable=True))
+
+    op.execute("""
+        UPDATE order_items SET name_at_order = (
+            SELECT products.name FROM products WHERE products.id = order_items.product_id
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_column('name_at_order')
@@ -0,0 +1,36 @@
+"""product keyset indexes
+
+Revision ID: 3b9c2d71e4a8
+Revises: f46937146507
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9c2d71e4a8'
+down_revision = 'f46937146507'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset seeks compare rating directly, so NULLs would silently drop rows
+    op.execute("UPDATE products SET rating = 0 WHERE rating IS NULL")
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.alter_column('rating', existing_type=sa.Float(), nullable=False)
+        batch_op.create_index('ix_products_price_id', ['price', 'id'], unique=False)
+        batch_op.create_index('ix_products_rating_id', ['rating', 'id'], unique=False)
+        batch_op.create_index('ix_products_name_id', ['name', 'id'], unique=False)
+        batch_op.create_index('ix_products_category_id', ['category_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_category_id')
+        batch_op.drop_index('ix_products_name_id')
+        batch_op.drop_index('ix_products_rating_id')
+        batch_op.drop_index('ix_products_price_id')
+        batch_op.alter_column('rating', existing_type=sa.Float(), nullable=True)
@@ -0,0 +1,33 @@
+"""order_items category_id_at_order
+
+Revision ID: 4a1e7c9b3f60
+Revises: c84f1a7d2e59
+Create Date: 2026-10-19 00:52:19.374826
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a1e7c9b3f60'
+down_revision = 'c84f1a7d2e59'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category_id_at_order', sa.Integer(), nullable=True))
+
+    # The best record of past categories is the current one
+    op.execute("""
+        UPDATE order_items SET category_id_at_order = (
+            SELECT products.category_id FROM products WHERE products.id = order_items.product_id
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_column('category_id_at_order')
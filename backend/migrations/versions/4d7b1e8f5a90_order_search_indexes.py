@@ -0,0 +1,39 @@
+"""order search indexes
+
+Revision ID: 4d7b1e8f5a90
+Revises: 9a4f6b3d2c18
+Create Date: 2026-10-18 15:27:06.184392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d7b1e8f5a90'
+down_revision = '9a4f6b3d2c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Status filters are exact matches now; older rows were written as "Pending" etc.
+    op.execute("UPDATE orders SET status = lower(status) WHERE status <> lower(status)")
+    op.execute("UPDATE orders SET status = 'pending' WHERE status IS NULL")
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_status_created_at', ['status', 'created_at'], unique=False)
+        batch_op.create_index('ix_orders_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_orders_total_price', ['total_price'], unique=False)
+
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=False)
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_username_lower', table_name='users')
+    op.drop_index('ix_users_email_lower', table_name='users')
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_total_price')
+        batch_op.drop_index('ix_orders_user_id_created_at')
+        batch_op.drop_index('ix_orders_status_created_at')
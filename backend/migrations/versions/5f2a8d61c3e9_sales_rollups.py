@@ -0,0 +1,41 @@
+"""sales rollups
+
+Revision ID: 5f2a8d61c3e9
+Revises: b17d4c2e9f03
+Create Date: 2026-10-18 18:20:37.448215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2a8d61c3e9'
+down_revision = 'b17d4c2e9f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sales_daily_category',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('day', 'category_id')
+    )
+    op.create_table('sales_daily_product',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    # Existing orders are loaded with `flask analytics rebuild`
+
+
+def downgrade():
+    op.drop_table('sales_daily_product')
+    op.drop_table('sales_daily_category')
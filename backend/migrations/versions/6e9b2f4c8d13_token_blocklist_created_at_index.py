@@ -0,0 +1,26 @@
+"""token_blocklist created_at index
+
+Revision ID: 6e9b2f4c8d13
+Revises: a3c7e9f2b614
+Create Date: 2026-10-18 23:02:15.640391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e9b2f4c8d13'
+down_revision = 'a3c7e9f2b614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('token_blocklist', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_blocklist_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_blocklist', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_blocklist_created_at'))
@@ -0,0 +1,69 @@
+"""product search index
+
+Revision ID: 7e1f4a9c0b52
+Revises: 3b9c2d71e4a8
+Create Date: 2026-10-18 10:03:17.552910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1f4a9c0b52'
+down_revision = '3b9c2d71e4a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("""
+            ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            ) STORED
+        """)
+        op.execute("CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, description, content='products', content_rowid='id',
+                tokenize='porter unicode61'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts(rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+                INSERT INTO products_fts(products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+                INSERT INTO products_fts(rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END
+        """)
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+        op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS products_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS products_fts_ai")
+        op.execute("DROP TABLE IF EXISTS products_fts")
@@ -0,0 +1,52 @@
+"""order summary columns
+
+Revision ID: 8c3e5f7a1d26
+Revises: e2a6c9d04b71
+Create Date: 2026-10-18 16:48:13.902457
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3e5f7a1d26'
+down_revision = 'e2a6c9d04b71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('subtotal', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('shipping_cost', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), nullable=True))
+
+    op.execute("""
+        UPDATE orders SET
+            subtotal = COALESCE((
+                SELECT SUM(order_items.price_at_order * order_items.quantity)
+                FROM order_items WHERE order_items.order_id = orders.id
+            ), 0),
+            item_count = (
+                SELECT COUNT(*) FROM order_items WHERE order_items.order_id = orders.id
+            )
+    """)
+    # Checkout always stored total = subtotal + shipping, which avoids
+    # parsing the free-form shipping_info JSON per dialect
+    op.execute("""
+        UPDATE orders SET shipping_cost = CASE
+            WHEN total_price > subtotal THEN total_price - subtotal ELSE 0 END
+    """)
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.alter_column('subtotal', existing_type=sa.Float(), nullable=False, server_default='0')
+        batch_op.alter_column('shipping_cost', existing_type=sa.Float(), nullable=False, server_default='0')
+        batch_op.alter_column('item_count', existing_type=sa.Integer(), nullable=False, server_default='0')
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('item_count')
+        batch_op.drop_column('shipping_cost')
+        batch_op.drop_column('subtotal')
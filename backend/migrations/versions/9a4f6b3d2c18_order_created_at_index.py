@@ -0,0 +1,26 @@
+"""order created_at index
+
+Revision ID: 9a4f6b3d2c18
+Revises: c5d8e2f13a67
+Create Date: 2026-10-18 14:41:52.730611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f6b3d2c18'
+down_revision = 'c5d8e2f13a67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_created_at_id', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_created_at_id')
@@ -0,0 +1,45 @@
+"""cart_items unique user product
+
+Revision ID: a3c7e9f2b614
+Revises: d6e0b3a7f851
+Create Date: 2026-10-18 21:12:37.418260
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e9f2b614'
+down_revision = 'd6e0b3a7f851'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Lines without a user or product can't be folded (or bought); drop them
+    op.execute("DELETE FROM cart_items WHERE user_id IS NULL OR product_id IS NULL")
+
+    # Fold duplicate lines into the oldest one before the constraint goes on
+    op.execute("""
+        UPDATE cart_items SET quantity = (
+            SELECT SUM(dup.quantity) FROM cart_items AS dup
+            WHERE dup.user_id = cart_items.user_id AND dup.product_id = cart_items.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1
+        )
+    """)
+    op.execute("""
+        DELETE FROM cart_items WHERE id NOT IN (
+            SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id
+        )
+    """)
+
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_cart_items_user_id_product_id', ['user_id', 'product_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cart_items_user_id_product_id', type_='unique')
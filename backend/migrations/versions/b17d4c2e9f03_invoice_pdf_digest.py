@@ -0,0 +1,31 @@
+"""invoice pdf digest
+
+Revision ID: b17d4c2e9f03
+Revises: 8c3e5f7a1d26
+Create Date: 2026-10-18 17:35:20.661094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b17d4c2e9f03'
+down_revision = '8c3e5f7a1d26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pdf_digest', sa.String(length=64), nullable=True))
+
+    # The old /invoices/<id>.pdf URLs were never served
+    op.execute("UPDATE invoices SET pdf_url = '/orders/' || CAST(order_id AS VARCHAR) || '/invoice.pdf'")
+
+
+def downgrade():
+    op.execute("UPDATE invoices SET pdf_url = '/invoices/' || CAST(order_id AS VARCHAR) || '.pdf'")
+
+    with op.batch_alter_table('invoices', schema=None) as batch_op:
+        batch_op.drop_column('pdf_digest')
@@ -0,0 +1,30 @@
+"""catalog state
+
+Revision ID: c5d8e2f13a67
+Revises: 7e1f4a9c0b52
+Create Date: 2026-10-18 11:26:05.104377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d8e2f13a67'
+down_revision = '7e1f4a9c0b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_state = op.create_table('catalog_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(catalog_state, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('catalog_state')
@@ -0,0 +1,36 @@
+"""order sync_version
+
+Revision ID: c84f1a7d2e59
+Revises: 0b5d8a3e6f27
+Create Date: 2026-10-19 00:18:42.903115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c84f1a7d2e59'
+down_revision = '0b5d8a3e6f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sync_version', sa.BigInteger(), nullable=True))
+
+    # Existing orders sort before every new stamp, in id order
+    op.execute("UPDATE orders SET sync_version = 0")
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.alter_column('sync_version', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.drop_index('ix_orders_user_id_updated_at_id')
+        batch_op.create_index('ix_orders_user_id_sync_version_id', ['user_id', 'sync_version', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_id_sync_version_id')
+        batch_op.create_index('ix_orders_user_id_updated_at_id', ['user_id', 'updated_at', 'id'], unique=False)
+        batch_op.drop_column('sync_version')
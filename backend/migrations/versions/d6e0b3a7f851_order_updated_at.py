@@ -0,0 +1,33 @@
+"""order updated_at
+
+Revision ID: d6e0b3a7f851
+Revises: 5f2a8d61c3e9
+Create Date: 2026-10-18 19:04:51.207734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6e0b3a7f851'
+down_revision = '5f2a8d61c3e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE orders SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_orders_user_id_updated_at_id', ['user_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_id_updated_at_id')
+        batch_op.drop_column('updated_at')
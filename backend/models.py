@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from sqlalchemy import MetaData, Text
+from sqlalchemy import MetaData, Text, BigInteger, func
 from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 
 metadata = MetaData()
 db = SQLAlchemy(metadata=metadata)
@@ -33,6 +35,10 @@ class User(db.Model):
             "created_at": self.created_at.isoformat()
         }
 
+# Case-insensitive customer lookups in order search
+db.Index('ix_users_email_lower', func.lower(User.email))
+db.Index('ix_users_username_lower', func.lower(User.username))
+
 class Category(db.Model):
     __tablename__ = "categories"
 
@@ -55,6 +61,13 @@ class Category(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'products'
+    # Composite (sort key, id) indexes back the keyset pagination in GET /products
+    __table_args__ = (
+        db.Index('ix_products_price_id', 'price', 'id'),
+        db.Index('ix_products_rating_id', 'rating', 'id'),
+        db.Index('ix_products_name_id', 'name', 'id'),
+        db.Index('ix_products_category_id', 'category_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
@@ -62,7 +75,7 @@ class Product(db.Model):
     image = db.Column(db.String(255), nullable=True)
     description = db.Column(db.Text, nullable=True)
     in_stock = db.Column(db.Boolean, default=True)
-    rating = db.Column(db.Float, default=0.0)
+    rating = db.Column(db.Float, nullable=False, default=0.0)
     reviews = db.Column(db.Integer, default=0)
 
     
@@ -88,6 +101,9 @@ class Product(db.Model):
 
 class CartItem(db.Model):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='uq_cart_items_user_id_product_id'),
+    )
 
     id          = db.Column(db.Integer, primary_key=True)
     quantity    = db.Column(db.Integer, nullable=False)
@@ -107,15 +123,66 @@ class CartItem(db.Model):
             "product": self.product.to_dict() if self.product else None
         }
 
+class next_sync_version(FunctionElement):
+    """Stamp for an order write that sync cursors can safely move past.
+
+    Postgres uses the writing transaction's id, SQLite (one writer at a time)
+    the next number after the highest stamp.
+    """
+    type = BigInteger()
+    inherit_cache = True
+
+
+class sync_horizon(FunctionElement):
+    """Stamps below this belong to transactions that have all finished."""
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(next_sync_version)
+def _next_sync_version(element, compiler, **kw):
+    return "txid_current()"
+
+
+@compiles(next_sync_version, "sqlite")
+def _next_sync_version_sqlite(element, compiler, **kw):
+    return "(SELECT COALESCE(MAX(sync_version), 0) + 1 FROM orders)"
+
+
+@compiles(sync_horizon)
+def _sync_horizon(element, compiler, **kw):
+    return "txid_snapshot_xmin(txid_current_snapshot())"
+
+
+@compiles(sync_horizon, "sqlite")
+def _sync_horizon_sqlite(element, compiler, **kw):
+    return "(SELECT COALESCE(MAX(sync_version), 0) + 1 FROM orders)"
+
+
 class Order(db.Model):
     __tablename__ = "orders"
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at', 'status', 'created_at'),
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_orders_total_price', 'total_price'),
+        db.Index('ix_orders_user_id_sync_version_id', 'user_id', 'sync_version', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every write (Core UPDATEs included) for incremental sync
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    sync_version = db.Column(db.BigInteger, default=next_sync_version(), onupdate=next_sync_version(), nullable=False)
     status = db.Column(db.String(50), default="pending")
     shipping_info = db.Column(JSON, nullable=True)
     total_price = db.Column(db.Float, nullable=False)
+    # Written at checkout so listings never have to read order_items;
+    # item_count is the number of order lines
+    subtotal = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    shipping_cost = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     user = db.relationship("User", back_populates="orders")
     order_items = db.relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
@@ -123,7 +190,6 @@ class Order(db.Model):
 
     def to_dict(self):
         shipping_info = self.shipping_info or {}
-        shipping_cost = shipping_info.get("shipping", 0)
 
         return {
             "id": self.id,
@@ -131,8 +197,9 @@ class Order(db.Model):
             "user": self.user.username if self.user else None,
             "createdAt": self.created_at.isoformat(),
             "status": self.status.lower(),
-            "subtotal": float(sum(item.price_at_order * item.quantity for item in self.order_items)),
-            "shipping": float(shipping_cost),
+            "subtotal": float(self.subtotal),
+            "shipping": float(self.shipping_cost),
+            "itemCount": self.item_count,
             "total": float(self.total_price),
             "shippingInfo": {
                 "firstName": shipping_info.get("firstName", ""),
@@ -161,6 +228,9 @@ class OrderItem(db.Model):
     id             = db.Column(db.Integer, primary_key=True)
     quantity       = db.Column(db.Integer, nullable=False)
     price_at_order = db.Column(db.Float,   nullable=False)
+    name_at_order  = db.Column(db.String(120))
+    # Rollups are keyed on the category at checkout, not the current one
+    category_id_at_order = db.Column(db.Integer)
     order_id       = db.Column(db.Integer, db.ForeignKey("orders.id"))
     product_id     = db.Column(db.Integer, db.ForeignKey("products.id"))
 
@@ -185,6 +255,8 @@ class Invoice(db.Model):
     invoice_number = db.Column(db.String(100), unique=True, nullable=False)
     issued_at      = db.Column(db.DateTime, default=datetime.utcnow)
     pdf_url        = db.Column(db.String(255))
+    # sha256 of the rendered PDF, which is also its file name in the cache
+    pdf_digest     = db.Column(db.String(64))
     order_id       = db.Column(db.Integer, db.ForeignKey("orders.id"), unique=True)
 
     # Relationships
@@ -206,4 +278,48 @@ class TokenBlocklist(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), nullable=False, unique=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class CatalogState(db.Model):
+    __tablename__ = "catalog_state"
+
+    # Single row (id=1) whose version every product/category write bumps
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+
+    # "<user_id>:<Idempotency-Key header>"; status_code stays NULL while the
+    # first request is still running
+    key = db.Column(db.String(255), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class SalesDailyCategory(db.Model):
+    __tablename__ = "sales_daily_category"
+
+    # Rollup of non-cancelled order lines by order day; maintained by
+    # checkout and status changes, rebuilt with `flask analytics rebuild`
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class SalesDailyProduct(db.Model):
+    __tablename__ = "sales_daily_product"
+
+    # No foreign key: sales history outlives deleted products
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
@@ -117,13 +117,16 @@ def seed():
                                 order_id=order.id,
                                 product_id=product.id,
                                 quantity=quantity,
-                                price_at_order=product.price
+                                price_at_order=product.price,
+                                category_id_at_order=product.category_id
                             )
                             db.session.add(item)
                             total_price += product.price * quantity
                             print(f"    Added {quantity}x {product.name} @ KES {product.price}")
                     
                     order.total_price = total_price
+                    order.subtotal = total_price
+                    order.item_count = len(selected_products)
                     db.session.commit()
                     print(f"  Order total: KES {total_price}")
 
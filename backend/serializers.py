@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, User, Product, Order, OrderItem
+
+
+class LazyLoadError(RuntimeError):
+    pass
+
+
+class Field:
+    def __init__(self, key, expr, convert=None, hidden=False):
+        self.key = key
+        self.expr = expr
+        self.convert = convert
+        self.hidden = hidden
+
+
+class Nested:
+    """A one-to-many collection loaded for a whole page with one ``IN`` query."""
+
+    def __init__(self, key, shape, parent_key, foreign_key):
+        self.key = key
+        self.shape = shape
+        self.parent_key = parent_key
+        self.foreign_key = foreign_key
+
+    def load(self, parent_ids):
+        if not parent_ids:
+            return {}
+        rows = (
+            self.shape.query()
+            .add_columns(self.foreign_key.label("_parent"))
+            .filter(self.foreign_key.in_(parent_ids))
+            .order_by(self.shape.model.id)
+            .all()
+        )
+        children = {}
+        for row, record in zip(rows, self.shape.dump(rows)):
+            children.setdefault(row._mapping["_parent"], []).append(record)
+        return children
+
+
+class Shape:
+    """Declares the output of an endpoint as column projections.
+
+    ``query()`` selects exactly the declared columns (outer-joining any
+    to-one tables they come from), and ``dump()`` maps the rows straight to
+    dicts, so no ORM objects are hydrated and no lazy loads can happen.
+    """
+
+    def __init__(self, model, fields, joins=(), nested=(), computed=None):
+        self.model = model
+        self.fields = fields
+        self.joins = joins
+        self.nested = nested
+        self.computed = computed or {}
+
+    def extend(self, fields=(), computed=None):
+        return Shape(
+            self.model, self.fields + list(fields), self.joins, self.nested,
+            {**self.computed, **(computed or {})},
+        )
+
+    def query(self):
+        query = db.session.query(*[f.expr.label(f.key) for f in self.fields]).select_from(self.model)
+        for target, onclause in self.joins:
+            query = query.outerjoin(target, onclause)
+        return query
+
+    def dump(self, rows, include=None):
+        records = []
+        for row in rows:
+            values = row._mapping
+            records.append({
+                f.key: f.convert(values[f.key]) if f.convert else values[f.key]
+                for f in self.fields
+            })
+
+        for nested in self.nested:
+            if include is not None and nested.key not in include:
+                continue
+            children = nested.load([record[nested.parent_key] for record in records])
+            for record in records:
+                record[nested.key] = children.get(record[nested.parent_key], [])
+
+        hidden = [f.key for f in self.fields if f.hidden]
+        for record in records:
+            for key, compute in self.computed.items():
+                record[key] = compute(record)
+            for key in hidden:
+                del record[key]
+        return records
+
+
+@contextmanager
+def serializing():
+    """Marks ORM-based serialization; lazy loads raise in strict mode."""
+    previous = g.get("_serializing", False)
+    g._serializing = True
+    try:
+        yield
+    finally:
+        g._serializing = previous
+
+
+def _reject_lazy_load(orm_execute_state):
+    if orm_execute_state.lazy_loaded_from is None:
+        return
+    if has_app_context() and g.get("_serializing"):
+        raise LazyLoadError(
+            f"Lazy load on {orm_execute_state.lazy_loaded_from.class_.__name__} during serialization"
+        )
+
+
+def init_serializers(app):
+    if app.config.get("STRICT_SERIALIZATION"):
+        event.listen(Session, "do_orm_execute", _reject_lazy_load)
+
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+def shipping_summary(info):
+    info = info or {}
+    return {
+        "firstName": info.get("firstName", ""),
+        "lastName": info.get("lastName", ""),
+        "email": info.get("email", ""),
+        "city": info.get("city", ""),
+        "county": info.get("county", ""),
+    }
+
+
+ORDER_ITEM_SHAPE = Shape(
+    OrderItem,
+    fields=[
+        Field("id", OrderItem.product_id),
+        Field("name", Product.name, lambda name: name or "Unknown Product"),
+        Field("image", Product.image),
+        Field("quantity", OrderItem.quantity),
+        Field("price", OrderItem.price_at_order, float),
+    ],
+    joins=[(Product, OrderItem.product_id == Product.id)],
+)
+
+# Same output as Order.to_dict()
+ORDER_SHAPE = Shape(
+    Order,
+    fields=[
+        Field("id", Order.id),
+        Field("userId", Order.user_id),
+        Field("user", User.username),
+        Field("createdAt", Order.created_at, isoformat),
+        Field("status", Order.status, lambda status: (status or "pending").lower()),
+        Field("subtotal", Order.subtotal, float),
+        Field("shipping", Order.shipping_cost, float),
+        Field("itemCount", Order.item_count),
+        Field("total", Order.total_price, float),
+        Field("_shipping_info", Order.shipping_info, hidden=True),
+    ],
+    joins=[(User, Order.user_id == User.id)],
+    nested=[Nested("items", ORDER_ITEM_SHAPE, "id", OrderItem.order_id)],
+    computed={
+        "shippingInfo": lambda o: shipping_summary(o["_shipping_info"]),
+    },
+)
+
+# Incremental sync (GET /orders/?updated_since=) uses the single spellings
+SYNC_ORDER_SHAPE = ORDER_SHAPE.extend(fields=[
+    Field("updatedAt", Order.updated_at, isoformat),
+    Field("_sync_version", Order.sync_version, hidden=True),
+])
+
+# GET /orders/ also echoes the raw shipping info and total under both spellings
+USER_ORDER_SHAPE = ORDER_SHAPE.extend(computed={
+    "total_price": lambda o: o["total"],
+    "shippingInfo": lambda o: o["_shipping_info"] or {},
+    "shipping_info": lambda o: o["_shipping_info"] or {},
+})
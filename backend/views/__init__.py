@@ -4,4 +4,5 @@ from .order import *
 from .product import *
 from .user import *
 from .cart import *
+from .analytics import *
 
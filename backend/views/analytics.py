@@ -0,0 +1,279 @@
+import click
+import logging
+from datetime import date, datetime, timedelta
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select, insert, delete, func
+from models import db, Category, Product, Order, OrderItem, SalesDailyCategory, SalesDailyProduct
+from views.bulk import dialect_insert
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/analytics')
+logger = logging.getLogger(__name__)
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 3 * 366
+MAX_TOP_PRODUCTS = 100
+
+
+def _upsert(model, keys, rows):
+    statement = dialect_insert(model)
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            column: getattr(model, column) + getattr(statement.excluded, column)
+            for column in rows[0] if column not in keys
+        },
+    )
+    db.session.execute(statement, rows)
+
+
+def apply_orders(lines, sign=1):
+    """Add (sign=1) or remove (sign=-1) orders' lines in the rollups.
+
+    ``lines`` are ``(order_id, day, product_id, category_id, quantity, price)``.
+    Runs in the caller's transaction. Rows are written in key order so that
+    concurrent callers lock the rollup rows they share in the same order.
+    """
+    by_category, by_product = {}, {}
+    for order_id, day, product_id, category_id, quantity, price in lines:
+        orders, units, revenue = by_category.get((day, category_id), (set(), 0, 0.0))
+        orders.add(order_id)
+        by_category[(day, category_id)] = (orders, units + quantity, revenue + price * quantity)
+        units, revenue = by_product.get((day, product_id), (0, 0.0))
+        by_product[(day, product_id)] = (units + quantity, revenue + price * quantity)
+    if not by_category:
+        return
+
+    _upsert(SalesDailyCategory, ['day', 'category_id'], [
+        {
+            'day': day, 'category_id': category_id,
+            'orders': sign * len(orders), 'units': sign * units, 'revenue': sign * revenue,
+        }
+        for (day, category_id), (orders, units, revenue) in sorted(by_category.items())
+    ])
+    _upsert(SalesDailyProduct, ['day', 'product_id'], [
+        {'day': day, 'product_id': product_id, 'units': sign * units, 'revenue': sign * revenue}
+        for (day, product_id), (units, revenue) in sorted(by_product.items())
+    ])
+
+
+def record_orders(lines, sign=1):
+    """``apply_orders`` in a transaction of its own, once the orders have committed.
+
+    Keeps the busy rollup rows out of checkout's locks; if this fails the
+    rollups lag the orders until ``flask analytics rebuild`` is run.
+    """
+    try:
+        apply_orders(lines, sign)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Failed to update sales rollups, rebuild them to catch up: {str(e)}")
+
+
+def record_order_lines(order_id, day, lines, sign=1):
+    """``record_orders`` for one order's ``(product_id, category_id, quantity, price)`` lines."""
+    record_orders([(order_id, day, *line) for line in lines], sign)
+
+
+def order_line_category():
+    # Lines from before category_id_at_order fall back to the product's category
+    return func.coalesce(OrderItem.category_id_at_order, Product.category_id)
+
+
+def orders_lines(order_ids):
+    """Rollup lines of the given orders, in ``apply_orders`` form."""
+    if not order_ids:
+        return []
+    return [
+        (order_id, created_at.date(), product_id, category_id, quantity, price)
+        for order_id, created_at, product_id, category_id, quantity, price in db.session.execute(
+            select(
+                Order.id, Order.created_at, OrderItem.product_id, order_line_category(),
+                OrderItem.quantity, OrderItem.price_at_order,
+            )
+            .select_from(OrderItem)
+            .join(Order, OrderItem.order_id == Order.id)
+            .outerjoin(Product, OrderItem.product_id == Product.id)
+            .where(OrderItem.order_id.in_(order_ids))
+        )
+    ]
+
+
+def rebuild_rollups():
+    """Recompute both rollups from orders and order_items in one transaction."""
+    day = func.date(Order.created_at)
+    category_id = order_line_category()
+    counted = (Order.status != 'cancelled')
+    db.session.execute(delete(SalesDailyCategory))
+    db.session.execute(delete(SalesDailyProduct))
+    db.session.execute(insert(SalesDailyCategory).from_select(
+        ['day', 'category_id', 'orders', 'units', 'revenue'],
+        select(
+            day, category_id, func.count(func.distinct(Order.id)),
+            func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.price_at_order),
+        )
+        .select_from(OrderItem)
+        .join(Order, OrderItem.order_id == Order.id)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .where(counted, category_id.isnot(None))
+        .group_by(day, category_id)
+    ))
+    db.session.execute(insert(SalesDailyProduct).from_select(
+        ['day', 'product_id', 'units', 'revenue'],
+        select(
+            day, OrderItem.product_id,
+            func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.price_at_order),
+        )
+        .select_from(OrderItem)
+        .join(Order, OrderItem.order_id == Order.id)
+        .where(counted)
+        .group_by(day, OrderItem.product_id)
+    ))
+    db.session.commit()
+
+
+@analytics_bp.cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the daily sales rollups from the order history."""
+    rebuild_rollups()
+    click.echo(
+        f"Rebuilt {SalesDailyCategory.query.count()} category-days "
+        f"and {SalesDailyProduct.query.count()} product-days"
+    )
+
+
+def _date_range():
+    today = datetime.utcnow().date()
+    end = date.fromisoformat(request.args['to']) if request.args.get('to') else today
+    start = (
+        date.fromisoformat(request.args['from']) if request.args.get('from')
+        else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    )
+    if start > end or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"from must be before to and at most {MAX_RANGE_DAYS} days apart")
+    return start, end
+
+
+def _period(day, interval):
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    if interval == 'week':
+        day -= timedelta(days=day.weekday())
+    elif interval == 'month':
+        day = day.replace(day=1)
+    return day.isoformat()
+
+
+def _analytics_request():
+    if get_jwt_identity()['role'] not in ['admin', 'manager']:
+        return None, (jsonify({'error': 'Unauthorized'}), 403)
+    interval = request.args.get('interval', 'day').lower()
+    if interval not in ('day', 'week', 'month'):
+        return None, (jsonify({'error': 'interval must be day, week or month'}), 400)
+    try:
+        start, end = _date_range()
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    return (start, end, interval), None
+
+
+@analytics_bp.route('/sales/categories', methods=['GET'])
+@jwt_required()
+def category_sales():
+    params, error = _analytics_request()
+    if error:
+        return error
+    start, end, interval = params
+
+    query = (
+        db.session.query(
+            SalesDailyCategory.day, Category.id, Category.name,
+            SalesDailyCategory.orders, SalesDailyCategory.units, SalesDailyCategory.revenue,
+        )
+        .join(Category, SalesDailyCategory.category_id == Category.id)
+        .filter(SalesDailyCategory.day.between(start, end))
+    )
+    if request.args.get('category'):
+        query = query.filter(func.lower(Category.name) == request.args['category'].lower())
+
+    series = {}
+    for day, category_id, name, orders, units, revenue in query:
+        key = (_period(day, interval), category_id)
+        entry = series.setdefault(key, {
+            'period': key[0], 'categoryId': category_id, 'category': name,
+            'orders': 0, 'units': 0, 'revenue': 0.0,
+        })
+        entry['orders'] += orders
+        entry['units'] += units
+        entry['revenue'] += revenue
+
+    rows = sorted(series.values(), key=lambda entry: (entry['period'], entry['categoryId']))
+    for entry in rows:
+        entry['revenue'] = round(entry['revenue'], 2)
+    return jsonify({
+        'from': start.isoformat(), 'to': end.isoformat(), 'interval': interval,
+        'series': rows,
+        'totals': {
+            'units': sum(entry['units'] for entry in rows),
+            'revenue': round(sum(entry['revenue'] for entry in rows), 2),
+        },
+    }), 200
+
+
+@analytics_bp.route('/sales/products', methods=['GET'])
+@jwt_required()
+def product_sales():
+    params, error = _analytics_request()
+    if error:
+        return error
+    start, end, interval = params
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_TOP_PRODUCTS)
+    in_range = SalesDailyProduct.day.between(start, end)
+
+    product_ids = list(dict.fromkeys(request.args.getlist('product_id', type=int)))
+    if not product_ids:
+        product_ids = [
+            product_id for (product_id,) in
+            db.session.query(SalesDailyProduct.product_id)
+            .filter(in_range)
+            .group_by(SalesDailyProduct.product_id)
+            .order_by(func.sum(SalesDailyProduct.revenue).desc(), SalesDailyProduct.product_id)
+            .limit(limit)
+        ]
+
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_(product_ids)))
+    products = {
+        product_id: {
+            'productId': product_id, 'name': names.get(product_id, 'Unknown Product'),
+            'units': 0, 'revenue': 0.0, 'series': {},
+        }
+        for product_id in product_ids
+    }
+    rows = (
+        db.session.query(SalesDailyProduct.day, SalesDailyProduct.product_id,
+                         SalesDailyProduct.units, SalesDailyProduct.revenue)
+        .filter(in_range, SalesDailyProduct.product_id.in_(product_ids))
+    )
+    for day, product_id, units, revenue in rows:
+        product = products[product_id]
+        product['units'] += units
+        product['revenue'] += revenue
+        point = product['series'].setdefault(_period(day, interval), {'units': 0, 'revenue': 0.0})
+        point['units'] += units
+        point['revenue'] += revenue
+
+    result = []
+    for product_id in product_ids:
+        product = products[product_id]
+        product['revenue'] = round(product['revenue'], 2)
+        product['series'] = [
+            {'period': period, 'units': point['units'], 'revenue': round(point['revenue'], 2)}
+            for period, point in sorted(product['series'].items())
+        ]
+        result.append(product)
+
+    return jsonify({
+        'from': start.isoformat(), 'to': end.isoformat(), 'interval': interval,
+        'products': result,
+    }), 200
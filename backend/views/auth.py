@@ -12,6 +12,7 @@ from datetime import datetime, timezone
 from functools import wraps
 from models import db, User, TokenBlocklist
 from views.mailserver import send_email
+from views.revocation import is_revoked, revoke
 
 auth_bp = Blueprint('auth', __name__)
 jwt = JWTManager()
@@ -36,9 +37,7 @@ def roles_required(*roles):
 
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    token = db.session.query(TokenBlocklist.id).filter_by(jti=jti).scalar()
-    return token is not None
+    return is_revoked(jwt_payload["jti"])
 
 @jwt.revoked_token_loader
 def revoked_token_response(jwt_header, jwt_payload):
@@ -138,6 +137,7 @@ def logout():
         token = TokenBlocklist(jti=jti, created_at=now)
         db.session.add(token)
         db.session.commit()
+        revoke(jti, now)
         return jsonify({"message": "Successfully logged out"}), 200
     except Exception as e:
         print(f"Logout error: {e}")
@@ -0,0 +1,57 @@
+from itertools import islice
+from sqlalchemy import insert, update, values, column, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db
+
+BATCH_SIZE = 1000
+
+
+def chunked(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def dialect_insert(model):
+    """INSERT construct with ``on_conflict_do_*`` support where the backend has it."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return insert(model)
+
+
+def update_by_id(model, rows, fields):
+    """Apply per-row ``fields`` values to ``model`` rows keyed by ``id``.
+
+    Postgres gets a single ``UPDATE ... FROM (VALUES ...) RETURNING``; other
+    backends fall back to one executemany over the ids that exist. Returns the
+    ids that were updated.
+    """
+    if not rows:
+        return []
+    table = model.__table__
+    if db.engine.dialect.name == "postgresql":
+        patch = values(
+            column("id", Integer), *[column(field, table.c[field].type) for field in fields],
+            name="patch",
+        ).data([(row["id"], *[row[field] for field in fields]) for row in rows])
+        statement = (
+            update(model)
+            .where(model.id == patch.c.id)
+            .values({field: patch.c[field] for field in fields})
+            .returning(model.id)
+            .execution_options(synchronize_session=False)
+        )
+        return [row_id for (row_id,) in db.session.execute(statement)]
+
+    ids = [row["id"] for row in rows]
+    existing = {row_id for (row_id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+    matched = [{"id": row["id"], **{field: row[field] for field in fields}} for row in rows if row["id"] in existing]
+    if matched:
+        db.session.execute(update(model), matched)
+    return [row["id"] for row in matched]
@@ -1,10 +1,72 @@
 # routes/cart.py
-from flask import Blueprint, request, jsonify
+import time
+import threading
+from collections import OrderedDict
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, CartItem, Product
+from models import db
+from views.catalog import fragment_snapshot, fragment_map, product_prices, json_response
+from views.cart_store import cart_store
 
 cart_bp = Blueprint('cart', __name__, url_prefix='/cart')
-from sqlalchemy.orm import joinedload
+
+MAX_CACHED_SUMMARIES = 100000
+
+# Per-user cart summaries: user_id -> (expires_at, catalog snapshot, summary).
+# Dropped on this worker's cart mutations and whenever cached prices are; the
+# TTL (CART_SUMMARY_TTL) bounds staleness from edits made on other workers.
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+def cart_item_json(item, user_id, fragments, prices=None):
+    item_id, product_id, quantity = item
+    line = {
+        "id": item_id,
+        "quantity": quantity,
+        "user_id": user_id,
+        "product_id": product_id,
+        "product": fragments.get(product_id)
+    }
+    if prices is not None:
+        price = prices.get(product_id)
+        line["lineTotal"] = round(price * quantity, 2) if price is not None else None
+    return line
+
+
+def cart_totals(items, prices):
+    """Totals over the lines whose product still exists."""
+    priced = [(product_id, quantity) for _, product_id, quantity in items if product_id in prices]
+    return {
+        "lineCount": len(priced),
+        "itemCount": sum(quantity for _, quantity in priced),
+        "subtotal": round(sum((prices[product_id] * quantity for product_id, quantity in priced), 0.0), 2),
+    }
+
+
+def cart_summary(user_id):
+    snapshot = fragment_snapshot()
+    now = time.monotonic()
+    with _summaries_lock:
+        cached = _summaries.get(user_id)
+        if cached is not None and cached[0] > now and cached[1] == snapshot:
+            _summaries.move_to_end(user_id)
+            return cached[2]
+
+    items = cart_store().items(user_id)
+    summary = cart_totals(items, product_prices([product_id for _, product_id, _ in items], snapshot))
+    ttl = current_app.config.get('CART_SUMMARY_TTL', 5.0)
+    with _summaries_lock:
+        _summaries[user_id] = (now + ttl, snapshot, summary)
+        _summaries.move_to_end(user_id)
+        while len(_summaries) > MAX_CACHED_SUMMARIES:
+            _summaries.popitem(last=False)
+    return summary
+
+
+def invalidate_cart_summary(user_id):
+    with _summaries_lock:
+        _summaries.pop(user_id, None)
 
 @cart_bp.route('', methods=['GET'])
 @jwt_required()
@@ -21,14 +83,19 @@ def view_cart():
             return jsonify({"error": "Invalid token format"}), 401
         
 
-        cart_items = (
-            CartItem.query
-            .options(joinedload(CartItem.product))
-            .filter_by(user_id=user_id)
-            .all()
-        )
-        
-        return jsonify([item.to_dict() for item in cart_items])
+        items = cart_store().items(user_id)
+        product_ids = [product_id for _, product_id, _ in items]
+        snapshot = fragment_snapshot()
+        fragments = fragment_map(product_ids, snapshot)
+
+        if request.args.get('totals', 'false').lower() != 'true':
+            return json_response([cart_item_json(item, user_id, fragments) for item in items])
+
+        prices = product_prices(product_ids, snapshot)
+        return json_response({
+            "items": [cart_item_json(item, user_id, fragments, prices) for item in items],
+            **cart_totals(items, prices),
+        })
     
     except Exception as e:
         print(f"Error in view_cart: {str(e)}")
@@ -63,24 +130,14 @@ def add_to_cart():
             return jsonify({"error": "quantity must be a positive integer"}), 400
         
 
-        product = Product.query.get(product_id)
-        if not product:
+        fragments = fragment_map([product_id], fragment_snapshot()) if isinstance(product_id, int) else {}
+        if product_id not in fragments:
             return jsonify({"error": "Product not found"}), 404
         
 
-        existing_item = CartItem.query.filter_by(user_id=user_id, product_id=product_id).first()
-        
-        if existing_item:
-
-            existing_item.quantity += quantity
-            db.session.commit()
-            return jsonify(existing_item.to_dict()), 200
-        else:
-
-            new_item = CartItem(user_id=user_id, product_id=product_id, quantity=quantity)
-            db.session.add(new_item)
-            db.session.commit()
-            return jsonify(new_item.to_dict()), 201
+        item, created = cart_store().add(user_id, product_id, quantity)
+        invalidate_cart_summary(user_id)
+        return json_response(cart_item_json(item, user_id, fragments), 201 if created else 200)
     
     except Exception as e:
         print(f"Error in add_to_cart: {str(e)}")
@@ -100,13 +157,10 @@ def remove_from_cart(item_id):
         if not user_id:
             return jsonify({"error": "Invalid token format"}), 401
         
-        item = CartItem.query.filter_by(id=item_id, user_id=user_id).first()
-        
-        if not item:
+        if not cart_store().remove(user_id, item_id):
             return jsonify({"error": "Cart item not found"}), 404
+        invalidate_cart_summary(user_id)
         
-        db.session.delete(item)
-        db.session.commit()
         return jsonify({"message": "Item removed successfully"}), 200
     
     except Exception as e:
@@ -139,14 +193,14 @@ def update_cart_item(item_id):
         if not isinstance(quantity, int) or quantity < 1:
             return jsonify({"error": "quantity must be a positive integer"}), 400
         
-        item = CartItem.query.filter_by(id=item_id, user_id=user_id).first()
+        item = cart_store().set(user_id, item_id, quantity)
         
         if not item:
             return jsonify({"error": "Cart item not found"}), 404
+        invalidate_cart_summary(user_id)
         
-        item.quantity = quantity
-        db.session.commit()
-        return jsonify(item.to_dict()), 200
+        fragments = fragment_map([item[1]], fragment_snapshot())
+        return json_response(cart_item_json(item, user_id, fragments), 200)
     
     except Exception as e:
         print(f"Error in update_cart_item: {str(e)}")
@@ -167,11 +221,110 @@ def clear_cart():
         if not user_id:
             return jsonify({"error": "Invalid token format"}), 401
         
-        CartItem.query.filter_by(user_id=user_id).delete()
-        db.session.commit()
+        cart_store().clear(user_id)
+        invalidate_cart_summary(user_id)
         return jsonify({"message": "Cart cleared successfully"}), 200
     
     except Exception as e:
         print(f"Error in clear_cart: {str(e)}")
         db.session.rollback()
-        return jsonify({"error": "Failed to clear cart", "details": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": "Failed to clear cart", "details": str(e)}), 500
+
+MAX_BATCH_OPERATIONS = 200
+BATCH_OPS = ('add', 'set', 'remove')
+
+
+def parse_operation(raw):
+    """Validate one batch operation into ``(op, item_id, product_id, quantity)``."""
+    if not isinstance(raw, dict) or raw.get('op') not in BATCH_OPS:
+        raise ValueError(f"op must be one of {', '.join(BATCH_OPS)}")
+    op = raw['op']
+    item_id, product_id = raw.get('item_id'), raw.get('product_id')
+    if op == 'add' and product_id is None:
+        raise ValueError("add needs product_id")
+    if item_id is None and product_id is None:
+        raise ValueError(f"{op} needs item_id or product_id")
+    for value in (item_id, product_id):
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+            raise ValueError("ids must be integers")
+    quantity = raw.get('quantity')
+    if op != 'remove' and (not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1):
+        raise ValueError("quantity must be a positive integer")
+    return op, item_id, product_id, quantity
+
+
+@cart_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def batch_update_cart():
+    try:
+        user_identity = get_jwt_identity()
+        if isinstance(user_identity, dict):
+            user_id = user_identity.get('id')
+        else:
+            user_id = user_identity
+
+        if not user_id:
+            return jsonify({"error": "Invalid token format"}), 401
+
+        data = request.get_json(silent=True) or {}
+        raw_operations = data.get('operations')
+        if not isinstance(raw_operations, list) or not raw_operations:
+            return jsonify({"error": "operations must be a non-empty list"}), 400
+        if len(raw_operations) > MAX_BATCH_OPERATIONS:
+            return jsonify({"error": f"At most {MAX_BATCH_OPERATIONS} operations per request"}), 400
+
+        operations = []
+        for index, raw in enumerate(raw_operations):
+            try:
+                operations.append(parse_operation(raw))
+            except ValueError as e:
+                return jsonify({"error": f"operations[{index}]: {e}"}), 400
+
+        snapshot = fragment_snapshot()
+        product_ids = {product_id for _, _, product_id, _ in operations if product_id is not None}
+        known = fragment_map(list(product_ids), snapshot) if product_ids else {}
+
+        def applicable(operation):
+            # Lines of deleted products can still be removed from the cart
+            op, _, product_id, _ = operation
+            return op == 'remove' or product_id is None or product_id in known
+
+        store = cart_store()
+        applied = iter(store.apply(user_id, [operation for operation in operations if applicable(operation)]))
+        invalidate_cart_summary(user_id)
+        results = [next(applied) if applicable(operation) else 'not_found' for operation in operations]
+
+        items = store.items(user_id)
+        product_ids = [product_id for _, product_id, _ in items]
+        fragments = fragment_map(product_ids, snapshot)
+        prices = product_prices(product_ids, snapshot)
+        return json_response({
+            "results": results,
+            "cart": [cart_item_json(item, user_id, fragments, prices) for item in items],
+            **cart_totals(items, prices),
+        })
+
+    except Exception as e:
+        print(f"Error in batch_update_cart: {str(e)}")
+        db.session.rollback()
+        return jsonify({"error": "Failed to update cart", "details": str(e)}), 500
+
+
+@cart_bp.route('/summary', methods=['GET'])
+@jwt_required()
+def view_cart_summary():
+    try:
+        user_identity = get_jwt_identity()
+        if isinstance(user_identity, dict):
+            user_id = user_identity.get('id')
+        else:
+            user_id = user_identity
+
+        if not user_id:
+            return jsonify({"error": "Invalid token format"}), 401
+
+        return jsonify(cart_summary(user_id)), 200
+
+    except Exception as e:
+        print(f"Error in view_cart_summary: {str(e)}")
+        return jsonify({"error": "Failed to fetch cart summary", "details": str(e)}), 500
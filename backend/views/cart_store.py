@@ -0,0 +1,563 @@
+import time
+import atexit
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import select, insert, delete, literal_column
+from models import db, CartItem, Product
+from views.bulk import dialect_insert, update_by_id
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0
+MAX_CACHED_CARTS = 100000
+
+
+def plan_operations(items, operations):
+    """Fold batch ``operations`` over a cart's ``items``.
+
+    Operations are ``(op, item_id, product_id, quantity)`` with op one of
+    add, set or remove and either id given. Returns the new quantity of
+    every touched product (0 meaning removed) and a result per operation.
+    """
+    by_item = {item_id: product_id for item_id, product_id, _ in items}
+    current = {product_id: quantity for _, product_id, quantity in items}
+    touched, results = {}, []
+    for op, item_id, product_id, quantity in operations:
+        if product_id is None:
+            product_id = by_item.get(item_id)
+        in_cart = touched.get(product_id, current.get(product_id, 0)) > 0
+        if product_id is None or (op == 'remove' and not in_cart) or (op == 'set' and item_id is not None and not in_cart):
+            results.append('not_found')
+            continue
+        if op == 'add':
+            touched[product_id] = touched.get(product_id, current.get(product_id, 0)) + quantity
+        elif op == 'set':
+            touched[product_id] = quantity
+        else:
+            touched[product_id] = 0
+        results.append('ok')
+    return touched, results
+
+
+class CartStore(ABC):
+    """Where carts live. Items are ``(item_id, product_id, quantity)``.
+
+    Every store returns items in the order they were first added. Mutations
+    return the affected item, or None when ``item_id`` isn't in the cart.
+    """
+
+    @abstractmethod
+    def items(self, user_id):
+        ...
+
+    @abstractmethod
+    def add(self, user_id, product_id, quantity):
+        """Add to a line, creating it if needed; returns ``(item, created)``."""
+
+    @abstractmethod
+    def set(self, user_id, item_id, quantity):
+        ...
+
+    @abstractmethod
+    def remove(self, user_id, item_id):
+        ...
+
+    @abstractmethod
+    def clear(self, user_id):
+        ...
+
+    @abstractmethod
+    def apply(self, user_id, operations):
+        """Apply batch operations atomically; returns the per-operation results."""
+
+    def flush(self, user_id=None):
+        """Make ``cart_items`` current for one user (or everyone)."""
+
+    def discard(self, user_id, product_ids):
+        """Forget lines that checkout has just deleted from ``cart_items``."""
+
+    def forget_products(self, product_ids):
+        """Drop deleted products from every cart; ``cart_items`` rows go by cascade."""
+
+
+class DbCartStore(CartStore):
+    """The original behaviour: ``cart_items`` is the cart."""
+
+    def items(self, user_id):
+        return [
+            tuple(row) for row in db.session.execute(
+                select(CartItem.id, CartItem.product_id, CartItem.quantity)
+                .where(CartItem.user_id == user_id)
+                .order_by(CartItem.id)
+            )
+        ]
+
+    def add(self, user_id, product_id, quantity):
+        # One statement against uq_cart_items_user_id_product_id, so concurrent
+        # adds of the same product accumulate instead of racing
+        statement = dialect_insert(CartItem).values(
+            user_id=user_id, product_id=product_id, quantity=quantity,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'product_id'],
+            set_={'quantity': CartItem.quantity + statement.excluded.quantity},
+        )
+        if db.engine.dialect.name == 'postgresql':
+            # xmax is 0 only on a freshly inserted row version
+            statement = statement.returning(CartItem.id, CartItem.quantity, literal_column('xmax = 0'))
+            item_id, total, created = db.session.execute(statement).one()
+        else:
+            statement = statement.returning(CartItem.id, CartItem.quantity)
+            item_id, total = db.session.execute(statement).one()
+            # Quantities are always positive, so only an insert returns just what was added
+            created = total == quantity
+        db.session.commit()
+        return (item_id, product_id, total), created
+
+    def set(self, user_id, item_id, quantity):
+        item = CartItem.query.filter_by(id=item_id, user_id=user_id).first()
+        if not item:
+            return None
+        item.quantity = quantity
+        db.session.commit()
+        return item.id, item.product_id, item.quantity
+
+    def remove(self, user_id, item_id):
+        deleted = CartItem.query.filter_by(id=item_id, user_id=user_id).delete()
+        db.session.commit()
+        return bool(deleted)
+
+    def clear(self, user_id):
+        CartItem.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+
+    def apply(self, user_id, operations):
+        # Lock the cart so concurrent edits can't interleave with the batch
+        items = [
+            tuple(row) for row in db.session.execute(
+                select(CartItem.id, CartItem.product_id, CartItem.quantity)
+                .where(CartItem.user_id == user_id)
+                .order_by(CartItem.id)
+                .with_for_update()
+            )
+        ]
+        touched, results = plan_operations(items, operations)
+        item_ids = {product_id: item_id for item_id, product_id, _ in items}
+
+        removed = [product_id for product_id, quantity in touched.items() if quantity <= 0 and product_id in item_ids]
+        updated = [
+            {'id': item_ids[product_id], 'quantity': quantity}
+            for product_id, quantity in touched.items() if quantity > 0 and product_id in item_ids
+        ]
+        added = [
+            {'user_id': user_id, 'product_id': product_id, 'quantity': quantity}
+            for product_id, quantity in touched.items() if quantity > 0 and product_id not in item_ids
+        ]
+        if removed:
+            db.session.execute(
+                delete(CartItem).where(CartItem.user_id == user_id, CartItem.product_id.in_(removed))
+            )
+        update_by_id(CartItem, updated, ['quantity'])
+        if added:
+            # Lines added concurrently since the cart was read take the batch's quantity
+            statement = dialect_insert(CartItem)
+            db.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=['user_id', 'product_id'],
+                    set_={'quantity': statement.excluded.quantity},
+                ),
+                added,
+            )
+        db.session.commit()
+        return results
+
+
+class WriteBehindCartStore(CartStore):
+    """Carts served from memory; dirty carts are written to ``cart_items``
+    in batches every FLUSH_INTERVAL seconds by a background thread.
+
+    Line ids are product ids. A crash loses at most the last interval of
+    cart edits.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        atexit.register(self._final_flush)
+
+    def _load(self, user_id):
+        rows = db.session.execute(
+            select(CartItem.product_id, CartItem.quantity)
+            .where(CartItem.user_id == user_id)
+            .order_by(CartItem.id)
+        ).all()
+        db.session.commit()
+        cart = {}
+        for product_id, quantity in rows:
+            cart[product_id] = cart.get(product_id, 0) + quantity
+        return cart
+
+    def _write(self, carts):
+        """Replace the ``cart_items`` rows of ``{user_id: {product_id: quantity}}``.
+
+        Lines for products that no longer exist are dropped, and each user is
+        written in their own transaction so one failing cart can't hold back
+        the rest. Returns the users whose write failed.
+        """
+        if not carts:
+            return []
+        product_ids = {product_id for cart in carts.values() for product_id in cart}
+        existing = set(
+            db.session.scalars(select(Product.id).where(Product.id.in_(product_ids)))
+        ) if product_ids else set()
+
+        failed = []
+        for user_id, cart in carts.items():
+            try:
+                db.session.execute(delete(CartItem).where(CartItem.user_id == user_id))
+                rows = [
+                    {'user_id': user_id, 'product_id': product_id, 'quantity': quantity}
+                    for product_id, quantity in cart.items() if product_id in existing
+                ]
+                if rows:
+                    db.session.execute(insert(CartItem), rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Cart write-behind failed for user {user_id}: {str(e)}")
+                failed.append(user_id)
+        return failed
+
+    def _flushed(self, user_id, failed):
+        # An explicit flush (checkout) must not go on with a cart that isn't saved
+        if user_id is not None and failed:
+            raise RuntimeError(f"Failed to save cart of user {user_id}")
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._flusher_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Cart write-behind failed: {str(e)}")
+
+    def _final_flush(self):
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Final cart flush failed: {str(e)}")
+
+
+class MemoryCartStore(WriteBehindCartStore):
+    """In-process carts. Every request of a user must reach the same process,
+    i.e. a single worker or sticky sessions; use the redis store otherwise."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._carts = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.RLock()
+
+    def _cart(self, user_id):
+        with self._lock:
+            cart = self._carts.get(user_id)
+            if cart is not None:
+                self._carts.move_to_end(user_id)
+                return cart
+        cart = self._load(user_id)
+        with self._lock:
+            cart = self._carts.setdefault(user_id, cart)
+            self._evict()
+            return cart
+
+    def _evict(self):
+        while len(self._carts) > MAX_CACHED_CARTS:
+            victim = next((uid for uid in self._carts if uid not in self._dirty), None)
+            if victim is None:
+                return
+            del self._carts[victim]
+
+    def _changed(self, user_id):
+        self._dirty.add(user_id)
+        self._start_flusher()
+
+    def items(self, user_id):
+        cart = self._cart(user_id)
+        with self._lock:
+            return [(product_id, product_id, quantity) for product_id, quantity in cart.items()]
+
+    def add(self, user_id, product_id, quantity):
+        cart = self._cart(user_id)
+        with self._lock:
+            created = product_id not in cart
+            cart[product_id] = cart.get(product_id, 0) + quantity
+            self._changed(user_id)
+            return (product_id, product_id, cart[product_id]), created
+
+    def set(self, user_id, item_id, quantity):
+        cart = self._cart(user_id)
+        with self._lock:
+            if item_id not in cart:
+                return None
+            cart[item_id] = quantity
+            self._changed(user_id)
+            return item_id, item_id, quantity
+
+    def remove(self, user_id, item_id):
+        cart = self._cart(user_id)
+        with self._lock:
+            if cart.pop(item_id, None) is None:
+                return False
+            self._changed(user_id)
+            return True
+
+    def clear(self, user_id):
+        cart = self._cart(user_id)
+        with self._lock:
+            cart.clear()
+            self._changed(user_id)
+
+    def apply(self, user_id, operations):
+        cart = self._cart(user_id)
+        with self._lock:
+            items = [(product_id, product_id, quantity) for product_id, quantity in cart.items()]
+            touched, results = plan_operations(items, operations)
+            for product_id, quantity in touched.items():
+                if quantity > 0:
+                    cart[product_id] = quantity
+                else:
+                    cart.pop(product_id, None)
+            if touched:
+                self._changed(user_id)
+            return results
+
+    def flush(self, user_id=None):
+        with self._lock:
+            users = [user_id] if user_id is not None else list(self._dirty)
+            users = [uid for uid in users if uid in self._dirty]
+            snapshot = {uid: dict(self._carts.get(uid, {})) for uid in users}
+            self._dirty.difference_update(users)
+        try:
+            failed = self._write(snapshot)
+        except Exception:
+            with self._lock:
+                self._dirty.update(users)
+            raise
+        with self._lock:
+            self._dirty.update(failed)
+        self._flushed(user_id, failed)
+
+    def discard(self, user_id, product_ids):
+        with self._lock:
+            cart = self._carts.get(user_id)
+            if cart is None:
+                return
+            for product_id in product_ids:
+                cart.pop(product_id, None)
+            # A flush racing the checkout may have re-inserted the bought
+            # lines; the next flush rewrites the cart without them
+            self._changed(user_id)
+
+    def forget_products(self, product_ids):
+        with self._lock:
+            for cart in self._carts.values():
+                for product_id in product_ids:
+                    cart.pop(product_id, None)
+
+
+class RedisCartStore(WriteBehindCartStore):
+    """Carts in a Redis hash per user, shared by every worker on the host.
+
+    ``cart:<user_id>`` maps product id to quantity (plus a ``_`` marker so an
+    empty cart is still known to be loaded) and the ``cart:dirty`` set feeds
+    the write-behind, which any worker may drain. Lines keep the order they
+    were added in through an ``o:<product_id>`` sequence number per line,
+    drawn from the ``#`` counter.
+    """
+
+    LOADED = "_"
+    SEQUENCE = "#"
+    ORDER = "o:"
+    DIRTY = "cart:dirty"
+    TTL = 7 * 24 * 3600
+
+    def __init__(self, app):
+        super().__init__(app)
+        import redis  # optional dependency, only needed for CART_STORE=redis
+        self.redis = redis.Redis.from_url(app.config.get('CART_REDIS_URL', 'redis://localhost:6379/0'))
+        self._watch_error = redis.WatchError
+
+    def _key(self, user_id):
+        return f"cart:{user_id}"
+
+    def _cart(self, user_id):
+        key = self._key(user_id)
+        raw = self.redis.hgetall(key)
+        if not raw:
+            cart = self._load(user_id)
+            # Another worker may have loaded it meanwhile; HSETNX keeps theirs
+            pipe = self.redis.pipeline()
+            pipe.hsetnx(key, self.LOADED, 1)
+            pipe.hsetnx(key, self.SEQUENCE, len(cart))
+            for sequence, (product_id, quantity) in enumerate(cart.items()):
+                pipe.hsetnx(key, product_id, quantity)
+                pipe.hsetnx(key, f"{self.ORDER}{product_id}", sequence)
+            pipe.expire(key, self.TTL)
+            pipe.execute()
+            raw = self.redis.hgetall(key)
+        return self._parse(raw)
+
+    def _parse(self, raw):
+        quantities, order = {}, {}
+        for field, value in raw.items():
+            field = field.decode()
+            if field.startswith(self.ORDER):
+                order[int(field[len(self.ORDER):])] = int(value)
+            elif field not in (self.LOADED, self.SEQUENCE) and int(value) > 0:
+                quantities[int(field)] = int(value)
+        ordered = sorted(quantities, key=lambda product_id: (order.get(product_id, 0), product_id))
+        return {product_id: quantities[product_id] for product_id in ordered}
+
+    def _lines(self, product_ids):
+        # A line's hash fields: its quantity and its place in the cart
+        return [field for product_id in product_ids for field in (product_id, f"{self.ORDER}{product_id}")]
+
+    def _changed(self, user_id):
+        pipe = self.redis.pipeline()
+        pipe.sadd(self.DIRTY, user_id)
+        pipe.expire(self._key(user_id), self.TTL)
+        pipe.execute()
+        self._start_flusher()
+
+    def items(self, user_id):
+        return [(product_id, product_id, quantity) for product_id, quantity in self._cart(user_id).items()]
+
+    def add(self, user_id, product_id, quantity):
+        key = self._key(user_id)
+        created = product_id not in self._cart(user_id)
+        total = self.redis.hincrby(key, product_id, quantity)
+        if created:
+            # HSETNX: of two racing adds of a new line the first keeps its place
+            self.redis.hsetnx(key, f"{self.ORDER}{product_id}", self.redis.hincrby(key, self.SEQUENCE, 1))
+        self._changed(user_id)
+        return (product_id, product_id, total), created
+
+    def set(self, user_id, item_id, quantity):
+        if item_id not in self._cart(user_id):
+            return None
+        self.redis.hset(self._key(user_id), item_id, quantity)
+        self._changed(user_id)
+        return item_id, item_id, quantity
+
+    def remove(self, user_id, item_id):
+        self._cart(user_id)
+        removed = self.redis.hdel(self._key(user_id), *self._lines([item_id]))
+        if removed:
+            self._changed(user_id)
+        return bool(removed)
+
+    def clear(self, user_id):
+        key = self._key(user_id)
+        pipe = self.redis.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, self.LOADED, 1)
+        pipe.execute()
+        self._changed(user_id)
+
+    def apply(self, user_id, operations):
+        # Optimistic: the batch is planned against a WATCHed cart and retried
+        # if another request changes the cart before it is written
+        key = self._key(user_id)
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.hgetall(key)
+                    if not raw:
+                        pipe.reset()
+                        self._cart(user_id)
+                        continue
+                    cart = self._parse(raw)
+                    items = [(product_id, product_id, quantity) for product_id, quantity in cart.items()]
+                    touched, results = plan_operations(items, operations)
+                    sequence = int(raw.get(self.SEQUENCE.encode(), 0))
+                    pipe.multi()
+                    for product_id, quantity in touched.items():
+                        if quantity > 0:
+                            pipe.hset(key, product_id, quantity)
+                            if product_id not in cart:
+                                sequence += 1
+                                pipe.hset(key, f"{self.ORDER}{product_id}", sequence)
+                        else:
+                            pipe.hdel(key, *self._lines([product_id]))
+                    pipe.hset(key, self.SEQUENCE, sequence)
+                    pipe.execute()
+                    break
+                except self._watch_error:
+                    continue
+        if touched:
+            self._changed(user_id)
+        return results
+
+    def flush(self, user_id=None):
+        if user_id is not None:
+            users = [user_id] if self.redis.srem(self.DIRTY, user_id) else []
+        else:
+            users = [int(uid) for uid in self.redis.spop(self.DIRTY, 500) or []]
+        if not users:
+            return
+        try:
+            failed = self._write({uid: self._cart(uid) for uid in users})
+        except Exception:
+            self.redis.sadd(self.DIRTY, *users)
+            raise
+        if failed:
+            self.redis.sadd(self.DIRTY, *failed)
+        self._flushed(user_id, failed)
+
+    def discard(self, user_id, product_ids):
+        if product_ids:
+            self.redis.hdel(self._key(user_id), *self._lines(product_ids))
+        self._changed(user_id)
+
+    def forget_products(self, product_ids):
+        if not product_ids:
+            return
+        fields = self._lines(product_ids)
+        pipe = self.redis.pipeline()
+        for key in self.redis.scan_iter(match="cart:*", count=1000):
+            if key != self.DIRTY.encode():
+                pipe.hdel(key, *fields)
+        pipe.execute()
+
+
+CART_STORES = {'db': DbCartStore, 'memory': MemoryCartStore, 'redis': RedisCartStore}
+_store = None
+_store_lock = threading.Lock()
+
+
+def cart_store():
+    """The configured store (CART_STORE: db, memory or redis), one per process."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                name = current_app.config.get('CART_STORE', 'db')
+                store_class = CART_STORES[name]
+                _store = store_class() if store_class is DbCartStore else store_class(current_app._get_current_object())
+    return _store
@@ -0,0 +1,224 @@
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, current_app, request
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from models import db, CatalogState, Product
+from serializers import serializing
+
+# Pre-encoded Product.to_dict() JSON, keyed by product id. Each entry carries
+# the clock value it was encoded at; writers advance the clock when they
+# invalidate, so a fragment built from rows read before a write is never kept.
+_fragments = {}
+# Product prices under the same clock, for cart totals that don't need the JSON
+_prices = {}
+# Clock of each product's last invalidation, oldest first. Past
+# MAX_DIRTY_PRODUCTS the oldest are folded into _cleared_at, which only makes
+# snapshots older than them skip caching.
+_dirty_since = {}
+_cleared_at = 0
+_clock = 0
+_lock = threading.Lock()
+MAX_DIRTY_PRODUCTS = 10000
+
+# Last catalog version seen by this worker. It is re-read from catalog_state
+# at most once per CATALOG_VERSION_TTL seconds, so revalidation requests are
+# answered without touching the database in between.
+_version = None
+_modified_at = None
+_checked_at = 0.0
+
+
+class RawJSON(str):
+    """Already-encoded JSON that json_response splices in verbatim."""
+
+
+def dumps(value):
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def fragment_snapshot():
+    """Take before querying products whose fragments will be cached."""
+    catalog_version()
+    return _clock
+
+
+def product_fragment(product, snapshot):
+    cached = _fragments.get(product.id)
+    if cached is not None:
+        return cached
+
+    with serializing():
+        fragment = RawJSON(dumps(product.to_dict()))
+    with _lock:
+        if snapshot >= max(_cleared_at, _dirty_since.get(product.id, 0)):
+            _fragments[product.id] = fragment
+            _prices[product.id] = product.price
+    return fragment
+
+
+def product_fragments(products, snapshot):
+    return [product_fragment(product, snapshot) for product in products]
+
+
+def fragment_map(product_ids, snapshot):
+    """``{product_id: fragment}``, loading only the uncached ones.
+
+    Ids that no longer exist are left out.
+    """
+    found = {pid: _fragments[pid] for pid in product_ids if pid in _fragments}
+    missing = [pid for pid in product_ids if pid not in found]
+    if missing:
+        products = Product.query.options(joinedload(Product.category)).filter(Product.id.in_(missing))
+        for product in products:
+            found[product.id] = product_fragment(product, snapshot)
+    return found
+
+
+def fragments_by_id(product_ids, snapshot):
+    """Fragments for ``product_ids`` in order; ids that no longer exist are skipped."""
+    found = fragment_map(product_ids, snapshot)
+    return [found[pid] for pid in product_ids if pid in found]
+
+
+def product_prices(product_ids, snapshot):
+    """``{product_id: price}``, querying only the uncached ones.
+
+    Ids that no longer exist are left out.
+    """
+    found = {pid: _prices[pid] for pid in product_ids if pid in _prices}
+    missing = [pid for pid in product_ids if pid not in found]
+    if missing:
+        rows = db.session.query(Product.id, Product.price).filter(Product.id.in_(missing)).all()
+        with _lock:
+            for product_id, price in rows:
+                found[product_id] = price
+                if snapshot >= max(_cleared_at, _dirty_since.get(product_id, 0)):
+                    _prices[product_id] = price
+    return found
+
+
+def invalidate_products(product_ids):
+    global _clock, _cleared_at
+    with _lock:
+        _clock += 1
+        for product_id in product_ids:
+            _fragments.pop(product_id, None)
+            _prices.pop(product_id, None)
+            _dirty_since.pop(product_id, None)
+            _dirty_since[product_id] = _clock
+        while len(_dirty_since) > MAX_DIRTY_PRODUCTS:
+            oldest = next(iter(_dirty_since))
+            _cleared_at = max(_cleared_at, _dirty_since.pop(oldest))
+
+
+def invalidate_catalog():
+    global _clock, _cleared_at
+    with _lock:
+        _clock += 1
+        _cleared_at = _clock
+        _fragments.clear()
+        _prices.clear()
+        _dirty_since.clear()
+
+
+def render_json(value):
+    if isinstance(value, RawJSON):
+        return value
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{dumps(str(k))}:{render_json(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(render_json(v) for v in value) + "]"
+    return dumps(value)
+
+
+def json_response(value, status=200):
+    return Response(render_json(value), status=status, mimetype="application/json")
+
+
+def catalog_version():
+    global _version, _modified_at, _checked_at
+    ttl = current_app.config.get("CATALOG_VERSION_TTL", 1.0)
+    now = time.monotonic()
+    if _version is not None and now - _checked_at < ttl:
+        return _version, _modified_at
+
+    state = db.session.get(CatalogState, 1)
+    version = state.version if state else 0
+    if _version is not None and version != _version:
+        # Another worker (or this one) changed the catalog: drop every fragment
+        invalidate_catalog()
+    _version = version
+    _modified_at = state.updated_at if state else None
+    _checked_at = now
+    return _version, _modified_at
+
+
+def bump_catalog_version():
+    """Call inside the writing transaction, before commit."""
+    global _checked_at
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(CatalogState)
+        .where(CatalogState.id == 1)
+        .values(version=CatalogState.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        db.session.add(CatalogState(id=1, version=1, updated_at=now))
+    _checked_at = 0.0
+
+
+def catalog_etag(version):
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    digest = hashlib.sha1(f"{request.path}?{args}".encode()).hexdigest()[:16]
+    return f"c{version}-{digest}"
+
+
+def catalog_cached(view):
+    """Conditional GET for public catalog views.
+
+    The ETag is derived from the catalog version and the query string, so a
+    matching If-None-Match (or a fresh If-Modified-Since) gets a 304 before
+    the view runs any SQL.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified_at = catalog_version()
+        etag = catalog_etag(version)
+
+        # HTTP dates have one-second resolution: advertise the end of the
+        # second the catalog changed in, and only once that second is over,
+        # so a later write in the same second can't be answered with a 304
+        last_modified = None
+        if modified_at:
+            last_modified = modified_at.replace(microsecond=0)
+            if modified_at.microsecond:
+                last_modified += timedelta(seconds=1)
+            if last_modified > datetime.utcnow():
+                last_modified = None
+
+        # If-None-Match wins over If-Modified-Since when both are sent
+        not_modified = False
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        elif request.if_modified_since and modified_at:
+            not_modified = modified_at <= request.if_modified_since.replace(tzinfo=None)
+
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
@@ -1,14 +1,85 @@
 from flask import Blueprint, jsonify, request
-from models import db, Category
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload, joinedload
+from models import db, Category, Product
+from views.product import SORT_KEYS, product_sort_values
+from views.pagination import CursorError, cursor_after, next_cursor, keyset_page, page_size
+from views.catalog import (
+    fragment_snapshot, product_fragments, json_response, catalog_cached, bump_catalog_version
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 category_bp = Blueprint('category', __name__, url_prefix='/categories')
 
 @category_bp.route('/', methods=['GET'])
+@catalog_cached
 def list_categories():
+    if request.args.get("summary", "false").lower() == "true":
+        rows = (
+            db.session.query(
+                Category.id, Category.name, Category.label, Category.icon,
+                func.count(Product.id).label("product_count"),
+                func.min(Product.price).label("min_price"),
+                func.max(Product.price).label("max_price"),
+            )
+            .outerjoin(Product, Product.category_id == Category.id)
+            .group_by(Category.id)
+            .order_by(Category.id)
+            .all()
+        )
+        return jsonify([
+            {
+                "id": row.id,
+                "name": row.name,
+                "label": row.label,
+                "icon": row.icon,
+                "productCount": row.product_count,
+                "minPrice": row.min_price,
+                "maxPrice": row.max_price,
+            }
+            for row in rows
+        ]), 200
 
-    categories = Category.query.all()
-    return jsonify([category.to_dict() for category in categories]), 200
+    snapshot = fragment_snapshot()
+    categories = Category.query.options(selectinload(Category.products)).all()
+    return json_response([
+        {
+            "id": category.id,
+            "name": category.name,
+            "label": category.label,
+            "icon": category.icon,
+            "products": product_fragments(category.products, snapshot)
+        }
+        for category in categories
+    ])
+
+
+@category_bp.route('/<int:id>/products', methods=['GET'])
+@catalog_cached
+def list_category_products(id):
+    sort = request.args.get("sort", "newest", type=str).lower()
+    if sort not in SORT_KEYS:
+        sort = "newest"
+
+    snapshot = fragment_snapshot()
+    category = Category.query.get_or_404(id)
+    query = Product.query.filter(Product.category_id == category.id).options(joinedload(Product.category))
+
+    try:
+        after = cursor_after(request.args.get("cursor"), sort)
+
+        products, last = keyset_page(
+            query, SORT_KEYS[sort], page_size(request.args.get("limit", type=int)),
+            after=after, row_values=lambda p: product_sort_values(sort, p),
+        )
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return json_response({
+        "category": {"id": category.id, "name": category.name, "label": category.label, "icon": category.icon},
+        "products": product_fragments(products, snapshot),
+        "next_cursor": next_cursor(sort, last),
+    })
 
 @category_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -26,6 +97,7 @@ def add_category():
 
     category = Category(name=data['name'])
     db.session.add(category)
+    bump_catalog_version()
     db.session.commit()
 
     return jsonify(category.to_dict()), 201
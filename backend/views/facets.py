@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from sqlalchemy import func
+from models import db, Product, Category
+from views.search import apply_search
+from views.catalog import catalog_version
+
+FACETS = ("category", "price", "stock")
+# KES bands; the last one is open-ended
+PRICE_BANDS = [(0, 500), (500, 1000), (1000, 2000), (2000, None)]
+MAX_CACHED_FILTERS = 512
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def parse_facets(raw):
+    if raw.lower() in ("all", "true"):
+        return list(FACETS)
+    requested = [name.strip().lower() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in FACETS]
+    if unknown:
+        raise ValueError(f"Unknown facets: {', '.join(unknown)}")
+    return requested
+
+
+def _band_filter(low, high):
+    if high is None:
+        return Product.price >= low
+    return (Product.price >= low) & (Product.price < high)
+
+
+def _compute(search, category_name):
+    # One grouped pass over the search matches: a row per category carrying
+    # its price-band and stock counts. The category facet ignores the
+    # category filter so shoppers still see the other categories' counts.
+    columns = [
+        Category.name,
+        Category.label,
+        func.count(Product.id),
+        func.count(Product.id).filter(Product.in_stock.is_(True)),
+    ]
+    columns += [func.count(Product.id).filter(_band_filter(low, high)) for low, high in PRICE_BANDS]
+
+    query = db.session.query(*columns).select_from(Product).join(Category)
+    if search:
+        query, _ = apply_search(query, search)
+    rows = query.group_by(Category.id, Category.name, Category.label).order_by(Category.name).all()
+
+    selected = [row for row in rows if category_name == "all" or row[0].lower() == category_name]
+    in_stock = sum(row[3] for row in selected)
+    return {
+        "category": [{"name": row[0], "label": row[1], "count": row[2]} for row in rows],
+        "price": [
+            {"min": low, "max": high, "count": sum(row[4 + i] for row in selected)}
+            for i, (low, high) in enumerate(PRICE_BANDS)
+        ],
+        "stock": {"inStock": in_stock, "outOfStock": sum(row[2] for row in selected) - in_stock},
+    }
+
+
+def product_facets(search, category_name, requested):
+    """Facet counts for a product filter, cached per (catalog version, filter)."""
+    version, _ = catalog_version()
+    key = (version, search, category_name)
+    with _lock:
+        facets = _cache.get(key)
+        if facets is not None:
+            _cache.move_to_end(key)
+
+    if facets is None:
+        facets = _compute(search, category_name)
+        with _lock:
+            _cache[key] = facets
+            while len(_cache) > MAX_CACHED_FILTERS:
+                _cache.popitem(last=False)
+
+    return {name: facets[name] for name in requested}
@@ -0,0 +1,183 @@
+import time
+import hashlib
+import threading
+from functools import wraps
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import request, jsonify, make_response, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+MAX_KEY_LENGTH = 200
+MAX_CACHED_RESPONSES = 1024
+POLL_INTERVAL = 0.1
+
+# Completed responses by scoped key: (fingerprint, status_code, body)
+_responses = OrderedDict()
+# Requests running in this process, so duplicates can wait on an Event
+# instead of polling the table
+_inflight = {}
+_lock = threading.Lock()
+_purged_at = 0.0
+
+
+def _remember(key, entry):
+    with _lock:
+        _responses[key] = entry
+        _responses.move_to_end(key)
+        while len(_responses) > MAX_CACHED_RESPONSES:
+            _responses.popitem(last=False)
+
+
+def _replay(fingerprint, entry):
+    stored_fingerprint, status_code, body = entry
+    if stored_fingerprint != fingerprint:
+        return jsonify({'error': 'Idempotency-Key was already used with a different request'}), 422
+    response = current_app.response_class(body, status=status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _stored(key):
+    row = db.session.execute(
+        select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.response_body)
+        .where(IdempotencyKey.key == key)
+    ).first()
+    db.session.commit()
+    return row
+
+
+def _purge_expired(ttl):
+    global _purged_at
+    now = time.monotonic()
+    if now - _purged_at < 3600:
+        return
+    _purged_at = now
+    db.session.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.created_at < datetime.utcnow() - timedelta(seconds=ttl)
+    ))
+    db.session.commit()
+
+
+def _claim(key, user_id, fingerprint, lease):
+    """Insert the in-flight marker row and return its claim time.
+
+    None if another request owns the key. A row left in flight for longer
+    than ``lease`` seconds belongs to a worker that died, and is taken over.
+    """
+    claimed_at = datetime.utcnow()
+    db.session.add(IdempotencyKey(key=key, user_id=user_id, fingerprint=fingerprint, created_at=claimed_at))
+    try:
+        db.session.commit()
+        return claimed_at
+    except IntegrityError:
+        db.session.rollback()
+
+    # Conditional, so only one of several retries wins the stale row
+    taken = db.session.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.created_at < claimed_at - timedelta(seconds=lease),
+        )
+        .values(fingerprint=fingerprint, created_at=claimed_at)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return claimed_at if taken else None
+
+
+def _wait_for_row(key, timeout):
+    # The first request runs in another worker: poll until it records a result
+    deadline = time.monotonic() + timeout
+    while True:
+        row = _stored(key)
+        if row is None or row.status_code is not None or time.monotonic() >= deadline:
+            return row
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated ``Idempotency-Key``.
+
+    Must be applied under ``jwt_required``; keys are scoped per user. Requests
+    without the header run as usual. Responses are kept for IDEMPOTENCY_TTL
+    seconds, except 5xx ones so that the client can retry those. A request
+    still unfinished after IDEMPOTENCY_LEASE seconds is presumed dead and the
+    next retry runs in its place.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Idempotency-Key', '').strip()
+        if not header:
+            return view(*args, **kwargs)
+        if len(header) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        identity = get_jwt_identity()
+        user_id = identity.get('id') if isinstance(identity, dict) else identity
+        key = f"{user_id}:{header}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        ttl = current_app.config.get('IDEMPOTENCY_TTL', 24 * 3600)
+        timeout = current_app.config.get('IDEMPOTENCY_WAIT', 30)
+        lease = current_app.config.get('IDEMPOTENCY_LEASE', 300)
+
+        while True:
+            with _lock:
+                entry = _responses.get(key)
+                running = _inflight.get(key)
+                if entry is None and running is None:
+                    done = _inflight[key] = threading.Event()
+            if entry is not None:
+                return _replay(fingerprint, entry)
+            if running is not None:
+                if not running.wait(timeout):
+                    return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+                continue
+            break
+
+        try:
+            _purge_expired(ttl)
+            claimed_at = _claim(key, user_id, fingerprint, lease)
+            if claimed_at is None:
+                row = _wait_for_row(key, timeout)
+                if row is None:
+                    # The first attempt failed and released the key
+                    return jsonify({'error': 'The original request failed, retry it'}), 409
+                if row.status_code is None:
+                    return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+                entry = (row.fingerprint, row.status_code, row.response_body)
+                _remember(key, entry)
+                return _replay(fingerprint, entry)
+
+            # Matching the claim time leaves the row alone if a retry has
+            # taken it over after the lease ran out
+            ours = (IdempotencyKey.key == key, IdempotencyKey.created_at == claimed_at)
+            response = None
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                if response is None or response.status_code >= 500:
+                    db.session.rollback()
+                    db.session.execute(delete(IdempotencyKey).where(*ours))
+                    db.session.commit()
+
+            if response.status_code < 500:
+                body = response.get_data(as_text=True)
+                db.session.execute(
+                    update(IdempotencyKey)
+                    .where(*ours)
+                    .values(status_code=response.status_code, response_body=body)
+                )
+                db.session.commit()
+                _remember(key, (fingerprint, response.status_code, body))
+            return response
+        finally:
+            with _lock:
+                _inflight.pop(key, None)
+            done.set()
+
+    return wrapper
@@ -0,0 +1,147 @@
+"""Minimal invoice PDF writer.
+
+Only the standard Helvetica fonts and text are used, so no PDF library is
+needed. Output is deterministic for a given invoice, which is what lets the
+cache address files by the digest of their bytes.
+"""
+import os
+import hashlib
+import tempfile
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+LINE_HEIGHT = 16
+ROWS_PER_PAGE = 38
+
+# Helvetica advance widths (per 1000 units) for the characters that appear in
+# amounts; used to right-align the number columns
+_AMOUNT_WIDTHS = {**{digit: 556 for digit in "0123456789"}, ",": 278, ".": 278, "-": 333, " ": 278}
+
+
+def _escape(text):
+    text = str(text).encode("cp1252", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _amount(value):
+    return f"{value:,.2f}"
+
+
+def _width(text, size):
+    return sum(_AMOUNT_WIDTHS.get(char, 556) for char in text) * size / 1000
+
+
+class _Page:
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, y, text, size=10, bold=False):
+        font = "F2" if bold else "F1"
+        self.ops.append(f"BT /{font} {size} Tf {x:.2f} {y:.2f} Td ({_escape(text)}) Tj ET")
+
+    def right(self, x, y, text, size=10, bold=False):
+        self.text(x - _width(text, size), y, text, size, bold)
+
+    def rule(self, y):
+        self.ops.append(f"{MARGIN} {y:.2f} m {PAGE_WIDTH - MARGIN} {y:.2f} l 0.5 w S")
+
+    def content(self):
+        return "\n".join(self.ops).encode("latin-1")
+
+
+def _header(page, document, number, pages):
+    top = PAGE_HEIGHT - MARGIN
+    page.text(MARGIN, top - 10, "The Beauty", size=20, bold=True)
+    page.right(PAGE_WIDTH - MARGIN, top - 10, f"Page {number} of {pages}", size=9)
+    page.text(MARGIN, top - 40, f"Invoice {document['invoice_number']}", size=13, bold=True)
+    page.text(MARGIN, top - 58, f"Order #{document['order_id']}    Date {document['date'][:10]}")
+
+    customer, address = document["customer"], document["shipping_address"]
+    page.text(MARGIN, top - 84, "Bill to", bold=True)
+    page.text(MARGIN, top - 100, customer["name"].strip() or "-")
+    page.text(MARGIN, top - 116, customer["email"] or "-")
+    page.text(300, top - 84, "Ship to", bold=True)
+    page.text(300, top - 100, ", ".join(part for part in (address["city"], address["county"]) if part) or "-")
+
+    y = top - 150
+    page.text(MARGIN, y, "Item", bold=True)
+    page.right(360, y, "Qty", bold=True)
+    page.right(450, y, "Price", bold=True)
+    page.right(PAGE_WIDTH - MARGIN, y, "Total", bold=True)
+    page.rule(y - 6)
+    return y - LINE_HEIGHT - 6
+
+
+def render_invoice_pdf(document):
+    """Render an invoice document (see ``invoice_document``) to PDF bytes."""
+    items = document["items"]
+    chunks = [items[i:i + ROWS_PER_PAGE] for i in range(0, len(items), ROWS_PER_PAGE)] or [[]]
+
+    pages = []
+    for number, chunk in enumerate(chunks, start=1):
+        page = _Page()
+        y = _header(page, document, number, len(chunks))
+        for item in chunk:
+            page.text(MARGIN, y, item["name"][:60])
+            page.right(360, y, str(item["quantity"]))
+            page.right(450, y, _amount(item["price"]))
+            page.right(PAGE_WIDTH - MARGIN, y, _amount(item["total"]))
+            y -= LINE_HEIGHT
+
+        if number == len(chunks):
+            page.rule(y + LINE_HEIGHT - 10)
+            y -= 8
+            for label, value, bold in (
+                ("Subtotal", document["subtotal"], False),
+                ("Shipping", document["shipping"], False),
+                ("Total (Ksh)", document["total"], True),
+            ):
+                page.text(360, y, label, bold=bold)
+                page.right(PAGE_WIDTH - MARGIN, y, _amount(value), bold=bold)
+                y -= LINE_HEIGHT
+        pages.append(page.content())
+
+    # Objects: 1 catalog, 2 page tree, 3-4 fonts, then a (page, content) pair per page
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{5 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    for name in ("Helvetica", "Helvetica-Bold"):
+        objects.append(f"<< /Type /Font /Subtype /Type1 /BaseFont /{name} /Encoding /WinAnsiEncoding >>".encode())
+    for i, content in enumerate(pages):
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {6 + 2 * i} 0 R >>"
+        ).encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def cache_path(cache_dir, digest):
+    return os.path.join(cache_dir, digest[:2], f"{digest}.pdf")
+
+
+def render_to_cache(document, cache_dir):
+    """Render ``document`` into the content-addressed cache; returns the digest.
+
+    Runs in the renderer process pool, so it only touches the filesystem.
+    """
+    pdf = render_invoice_pdf(document)
+    digest = hashlib.sha256(pdf).hexdigest()
+    path = cache_path(cache_dir, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, path)
+    return digest
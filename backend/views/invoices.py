@@ -0,0 +1,133 @@
+import os
+import atexit
+import multiprocessing
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from flask import current_app
+from sqlalchemy import select, update, func
+from models import db, Product, OrderItem, Invoice
+from views.invoice_pdf import cache_path, render_to_cache
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+# Renders submitted by this process, by invoice id, so a download that races
+# the background render waits for it instead of rendering a second time
+_pending = {}
+_lock = threading.Lock()
+
+
+def invoice_document(invoice_number, order_id, date, shipping_info, items, subtotal, shipping, total):
+    """The invoice as issued; ``items`` are ``(name, quantity, price)`` tuples."""
+    shipping_info = shipping_info or {}
+    return {
+        'invoice_number': invoice_number,
+        'order_id': order_id,
+        'date': date.isoformat(),
+        'customer': {
+            'name': f"{shipping_info.get('firstName', '')} {shipping_info.get('lastName', '')}",
+            'email': shipping_info.get('email', '')
+        },
+        'shipping_address': {
+            'city': shipping_info.get('city', ''),
+            'county': shipping_info.get('county', '')
+        },
+        'items': [
+            {
+                'name': name or "Unknown Product",
+                'quantity': quantity,
+                'price': float(price),
+                'total': float(price * quantity)
+            }
+            for name, quantity, price in items
+        ],
+        'subtotal': float(subtotal),
+        'shipping': float(shipping),
+        'total': float(total),
+    }
+
+
+def order_invoice_document(order, invoice):
+    # Names as ordered, so a re-render matches the bytes first issued
+    items = db.session.execute(
+        select(func.coalesce(OrderItem.name_at_order, Product.name), OrderItem.quantity, OrderItem.price_at_order)
+        .select_from(OrderItem)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .where(OrderItem.order_id == order.id)
+        .order_by(OrderItem.id)
+    ).all()
+    return invoice_document(
+        invoice.invoice_number, order.id, order.created_at, order.shipping_info,
+        items, order.subtotal, order.shipping_cost, order.total_price,
+    )
+
+
+def invoice_cache_dir():
+    return current_app.config.get('INVOICE_CACHE_DIR') or os.path.join(current_app.instance_path, 'invoices')
+
+
+def cached_pdf(digest):
+    """Path of a rendered invoice, or None if it is not on this host's disk."""
+    if not digest:
+        return None
+    path = cache_path(invoice_cache_dir(), digest)
+    return path if os.path.exists(path) else None
+
+
+def _executor():
+    global _pool
+    workers = current_app.config.get('INVOICE_RENDER_WORKERS', 2)
+    if workers <= 0:
+        return None
+    with _lock:
+        if _pool is None:
+            # Workers are threaded; forking one mid-request can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_pool.shutdown, wait=False)
+        return _pool
+
+
+def _record_digest(app, invoice_id, future):
+    # The render stays pending until its digest is stored, so a download in
+    # between waits on it rather than rendering again
+    try:
+        digest = future.result()
+        with app.app_context():
+            db.session.execute(
+                update(Invoice)
+                .where(Invoice.id == invoice_id, Invoice.pdf_digest.is_(None))
+                .values(pdf_digest=digest)
+            )
+            db.session.commit()
+    except Exception as e:
+        logger.error(f"Failed to render invoice {invoice_id}: {str(e)}")
+    finally:
+        with _lock:
+            _pending.pop(invoice_id, None)
+
+
+def render_invoice(invoice_id, document):
+    """Render an invoice outside the request path; returns a Future of its digest."""
+    with _lock:
+        future = _pending.get(invoice_id)
+        if future is not None:
+            return future
+
+    app = current_app._get_current_object()
+    pool = _executor()
+    cache_dir = invoice_cache_dir()
+    if pool is None:
+        # INVOICE_RENDER_WORKERS=0 renders inline, e.g. for local development
+        future = Future()
+        try:
+            future.set_result(render_to_cache(document, cache_dir))
+        except Exception as e:
+            future.set_exception(e)
+    else:
+        future = pool.submit(render_to_cache, document, cache_dir)
+        with _lock:
+            _pending[invoice_id] = future
+
+    future.add_done_callback(lambda done: _record_digest(app, invoice_id, done))
+    return future
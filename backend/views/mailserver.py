@@ -322,3 +322,65 @@ The Beauty Team 💖
 
     app = current_app._get_current_object()
     Thread(target=send_async_email, args=(app, msg)).start()
+
+STATUS_MESSAGES = {
+    "processing": "We're getting your order ready.",
+    "shipped": "Your order is on its way! Estimated delivery is 1-3 days.",
+    "delivered": "Your order has been delivered. Enjoy!",
+    "cancelled": "Your order has been cancelled. If you didn't request this, please contact us.",
+}
+
+def send_bulk_async_email(app, messages):
+    with app.app_context():
+        try:
+            with mail.connect() as conn:
+                for msg in messages:
+                    conn.send(msg)
+        except Exception as e:
+            print(f"Failed to send emails: {e}")
+
+def send_order_status_emails(updates):
+    """Queue one status email per ``{name, email, order_id, status}`` and send
+    them from a single background thread over one SMTP connection."""
+    messages = []
+    for update in updates:
+        if not update["email"]:
+            continue
+        status = update["status"]
+        note = STATUS_MESSAGES.get(status, "")
+        html_body = f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; background-color: #ffffff; color: #3a0c1a; padding: 20px; line-height: 1.6;">
+                <h2 style="color: #d6336c;">Hi {update['name'] or 'there'}, your order is {status}</h2>
+                <p><strong>Order ID:</strong> {update['order_id']}</p>
+                <p>{note}</p>
+                <div style="margin-top: 30px;">
+                    <a href="https://beauty-shop-opal.vercel.app/{update['order_id']}"
+                       style="background-color: #e11d48; color: white; padding: 12px 25px; text-decoration: none; border-radius: 6px; font-weight: bold;">
+                        View Order
+                    </a>
+                </div>
+                <p style="margin-top: 40px;">With love,<br/><strong>The Beauty Team</strong></p>
+            </body>
+        </html>
+        """
+        text_body = f"""Hi {update['name'] or 'there'},
+
+Your order #{update['order_id']} is {status}.
+{note}
+
+View your order: https://beauty-shop-opal.vercel.app/{update['order_id']}
+
+With love,
+The Beauty Team
+"""
+        messages.append(Message(
+            subject=f"Order #{update['order_id']} {status} | The Beauty",
+            recipients=[update["email"]],
+            html=html_body,
+            body=text_body
+        ))
+
+    if messages:
+        app = current_app._get_current_object()
+        Thread(target=send_bulk_async_email, args=(app, messages)).start()
@@ -1,16 +1,43 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Product, Category, CartItem, Order, OrderItem, Invoice
-from datetime import datetime
+from sqlalchemy import func, or_, select, insert, update, delete
+from models import db, User, Product, Category, CartItem, Order, OrderItem, Invoice, sync_horizon
+from datetime import datetime, timedelta, timezone
 import uuid
 import logging
 from sqlalchemy.exc import SQLAlchemyError
-from views.mailserver import send_email, send_order_confirmation_email
+from views.mailserver import send_email, send_order_confirmation_email, send_order_status_emails
+from serializers import ORDER_SHAPE, USER_ORDER_SHAPE, SYNC_ORDER_SHAPE
+from views.rankings import record_sales
+from views.idempotency import idempotent
+from views.cart import invalidate_cart_summary
+from views.cart_store import cart_store
+from views.order_export import export_orders
+from views.analytics import record_orders, record_order_lines, orders_lines
+from views.invoices import invoice_document, order_invoice_document, render_invoice, cached_pdf
+from views.pagination import (
+    CursorError, cursor_after, next_cursor, encode_cursor, keyset_order, keyset_page, page_size
+)
 
 
 order_bp = Blueprint('order', __name__, url_prefix='/orders')
 logger = logging.getLogger(__name__)
 
+ORDER_PAGE_SIZE = 50
+MAX_ORDER_PAGE_SIZE = 200
+ORDER_PAGE_KEYS = [(Order.created_at, True), (Order.id, True)]
+VALID_STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+# Allowed moves for bulk updates; the single-order endpoint stays an admin override
+ORDER_TRANSITIONS = {
+    'pending': ['processing', 'shipped', 'cancelled'],
+    'processing': ['shipped', 'cancelled'],
+    'shipped': ['delivered'],
+    'delivered': [],
+    'cancelled': [],
+}
+MAX_BULK_STATUS_UPDATES = 1000
+SYNC_PAGE_KEYS = [(Order.sync_version, False), (Order.id, False)]
+
 
 def get_current_user_id():
     try:
@@ -28,6 +55,71 @@ def get_current_user_id():
         return None
 
 
+def order_page(orders_query):
+    """One ``(created_at, id)`` keyset page of ORDER_SHAPE rows plus its cursor."""
+    after = cursor_after(request.args.get('cursor'), "created")
+    if after is not None:
+        after = [datetime.fromisoformat(after[0]), after[1]]
+    rows, last = keyset_page(
+        orders_query, ORDER_PAGE_KEYS,
+        page_size(request.args.get('limit', type=int), ORDER_PAGE_SIZE, MAX_ORDER_PAGE_SIZE),
+        after=after,
+        row_values=lambda row: [row.createdAt.isoformat(), row.id],
+    )
+    return {"orders": ORDER_SHAPE.dump(rows, order_includes()), "next_cursor": next_cursor("created", last)}
+
+
+def order_includes():
+    # Listings carry items unless ?items=false; the summary columns cover the rest
+    if request.args.get('items', 'true').lower() == 'false':
+        return ()
+    return None
+
+
+def sync_orders(user_id):
+    """Orders created or changed since the ``updated_since`` cursor.
+
+    An empty ``updated_since`` starts a full sync. ``cursor`` is always
+    returned for the next poll; ``has_more`` asks the client to fetch again
+    straight away.
+    """
+    token = request.args.get('updated_since')
+    after = cursor_after(token, "version")
+
+    # Only rows stamped by transactions that have all finished, so a write
+    # still in flight can never end up behind a cursor already handed out
+    orders_query = SYNC_ORDER_SHAPE.query().filter(Order.user_id == user_id, Order.sync_version < sync_horizon())
+    row_values = lambda row: [row._mapping["_sync_version"], row.id]
+    rows, last = keyset_page(
+        orders_query, SYNC_PAGE_KEYS,
+        page_size(request.args.get('limit', type=int), ORDER_PAGE_SIZE, MAX_ORDER_PAGE_SIZE),
+        after=after, row_values=row_values,
+    )
+
+    if rows:
+        cursor = encode_cursor({"sort": "version", "after": row_values(rows[-1])})
+    elif token:
+        cursor = token
+    else:
+        cursor = None
+    return {
+        "orders": SYNC_ORDER_SHAPE.dump(rows, order_includes()),
+        "cursor": cursor,
+        "has_more": last is not None,
+    }
+
+
+def parse_date(raw, end=False):
+    # A bare date as the upper bound covers that whole day
+    value = datetime.fromisoformat(raw)
+    if value.tzinfo is not None:
+        # created_at is stored as naive UTC
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if end and len(raw) == 10:
+        value += timedelta(days=1)
+    return value
+
+
 @order_bp.route('/all', methods=['GET'])
 @jwt_required()
 def get_all_orders():
@@ -42,25 +134,127 @@ def get_all_orders():
 
         status_filter = request.args.get('status')
 
-        if user.role in ['admin', 'manager']:
-            orders_query = Order.query
-        else:
-            orders_query = Order.query.filter_by(user_id=user_id)
+        orders_query = ORDER_SHAPE.query()
+        if user.role not in ['admin', 'manager']:
+            orders_query = orders_query.filter(Order.user_id == user_id)
 
         if status_filter and status_filter.lower() != "all":
-            orders_query = orders_query.filter(Order.status.ilike(f'%{status_filter}%'))
+            orders_query = orders_query.filter(Order.status == status_filter.lower())
 
-        orders_query = orders_query.order_by(Order.created_at.desc())
-        orders = orders_query.all()
+        if request.args.get('limit') is None and request.args.get('cursor') is None:
+            # Unpaginated, as before pagination; existing clients read every order
+            orders_query = orders_query.order_by(*keyset_order(ORDER_PAGE_KEYS))
+            return jsonify({"orders": ORDER_SHAPE.dump(orders_query.all(), order_includes())}), 200
 
-        orders_data = [order.to_dict() for order in orders]
-        return jsonify({"orders": orders_data}), 200
+        try:
+            return jsonify(order_page(orders_query)), 200
+        except (CursorError, ValueError, TypeError, IndexError):
+            return jsonify({'error': 'Invalid cursor'}), 400
 
     except Exception as e:
         logger.error(f"Error fetching all orders: {str(e)}")
         return jsonify({'error': 'Failed to fetch orders', 'details': str(e)}), 500
 
 
+@order_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_orders():
+    try:
+        user_id = get_current_user_id()
+        if user_id is None:
+            return jsonify({'error': 'Invalid token or user not authenticated'}), 401
+
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        if user.role not in ['admin', 'manager']:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        args = request.args
+        orders_query = ORDER_SHAPE.query()
+
+        status = args.get('status', '').strip().lower()
+        if status and status != 'all':
+            if status not in VALID_STATUSES:
+                return jsonify({'error': 'Invalid status', 'valid_statuses': VALID_STATUSES}), 400
+            orders_query = orders_query.filter(Order.status == status)
+
+        customer = args.get('customer', '').strip().lower()
+        if customer:
+            # Resolve the customer first so the order scan runs on (user_id, created_at)
+            customer_ids = [
+                row_id for (row_id,) in db.session.query(User.id).filter(
+                    or_(func.lower(User.email) == customer, func.lower(User.username) == customer)
+                )
+            ]
+            orders_query = orders_query.filter(Order.user_id.in_(customer_ids))
+
+        try:
+            if args.get('from'):
+                orders_query = orders_query.filter(Order.created_at >= parse_date(args['from']))
+            if args.get('to'):
+                orders_query = orders_query.filter(Order.created_at < parse_date(args['to'], end=True))
+        except ValueError:
+            return jsonify({'error': 'Dates must be ISO 8601, e.g. 2024-01-31'}), 400
+
+        min_total = args.get('min_total', type=float)
+        max_total = args.get('max_total', type=float)
+        if min_total is not None:
+            orders_query = orders_query.filter(Order.total_price >= min_total)
+        if max_total is not None:
+            orders_query = orders_query.filter(Order.total_price <= max_total)
+
+        try:
+            return jsonify(order_page(orders_query)), 200
+        except (CursorError, ValueError, TypeError, IndexError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    except Exception as e:
+        logger.error(f"Error searching orders: {str(e)}")
+        return jsonify({'error': 'Failed to search orders'}), 500
+
+
+@order_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_order_lines():
+    user_id = get_current_user_id()
+    if user_id is None:
+        return jsonify({'error': 'Invalid token or user not authenticated'}), 401
+
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    if user.role not in ['admin', 'manager']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    args = request.args
+    fmt = args.get('format', 'csv').lower()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+
+    filters = []
+    status = args.get('status', '').strip().lower()
+    if status and status != 'all':
+        if status not in VALID_STATUSES:
+            return jsonify({'error': 'Invalid status', 'valid_statuses': VALID_STATUSES}), 400
+        filters.append(Order.status == status)
+    try:
+        if args.get('from'):
+            filters.append(Order.created_at >= parse_date(args['from']))
+        if args.get('to'):
+            filters.append(Order.created_at < parse_date(args['to'], end=True))
+    except ValueError:
+        return jsonify({'error': 'Dates must be ISO 8601, e.g. 2024-01-31'}), 400
+
+    name = "-".join(["orders"] + [args[key][:10] for key in ('from', 'to') if args.get(key)])
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_orders(filters, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
 @order_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_user_orders():
@@ -69,43 +263,21 @@ def get_user_orders():
         if user_id is None:
             return jsonify({'error': 'Invalid token or user not authenticated'}), 401
 
+        if 'updated_since' in request.args:
+            try:
+                return jsonify(sync_orders(user_id)), 200
+            except (CursorError, ValueError, TypeError, IndexError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+
         status_filter = request.args.get('status')
 
-        orders_query = Order.query.filter_by(user_id=user_id)
+        orders_query = USER_ORDER_SHAPE.query().filter(Order.user_id == user_id)
 
         if status_filter and status_filter.lower() != "all":
-            orders_query = orders_query.filter(Order.status.ilike(f'%{status_filter}%'))
+            orders_query = orders_query.filter(Order.status == status_filter.lower())
 
         orders_query = orders_query.order_by(Order.created_at.desc())
-        orders = orders_query.all()
-
- 
-        orders_data = []
-        for order in orders:
-            order_dict = order.to_dict()
-            
-            order_dict.update({
-                'id': order.id,
-                'userId': order.user_id,
-                'status': order.status.lower() if order.status else 'pending',
-                'createdAt': order.created_at.isoformat() if order.created_at else datetime.now().isoformat(),
-                'total_price': float(order.total_price) if order.total_price else 0.0,
-                'total': float(order.total_price) if order.total_price else 0.0,
-                'shippingInfo': order.shipping_info if order.shipping_info else {},
-                'shipping_info': order.shipping_info if order.shipping_info else {},
-                'items': [
-                    {
-                        'id': item.product.id,
-                        'name': item.product.name,
-                        'price': float(item.price_at_order),
-                        'quantity': item.quantity,
-                        'image': item.product.image if hasattr(item.product, 'image') else None
-                    }
-                    for item in order.order_items
-                ] if hasattr(order, 'order_items') else []
-            })
-            
-            orders_data.append(order_dict)
+        orders_data = USER_ORDER_SHAPE.dump(orders_query.all(), order_includes())
 
         return jsonify({"orders": orders_data}), 200
 
@@ -161,6 +333,7 @@ def get_order_details(order_id):
 
 @order_bp.route('/checkout', methods=['POST'])
 @jwt_required()
+@idempotent
 def checkout():
     try:
         user_id = get_current_user_id()
@@ -172,84 +345,144 @@ def checkout():
         if not data or 'shipping_info' not in data:
             return jsonify({'error': 'Shipping information is required'}), 400
 
-        cart_items = CartItem.query.filter_by(user_id=user_id).all()
-        if not cart_items:
+        shipping_info = data['shipping_info']
+        shipping_cost = float(shipping_info.get('shipping', 0))
+
+        # Write-behind cart stores may hold edits not yet in cart_items
+        store = cart_store()
+        store.flush(user_id)
+
+        # Lock the cart rows: a concurrent checkout of the same cart waits and
+        # then finds them gone instead of ordering them twice, and a line being
+        # edited is waited for rather than left out of the order. Product rows
+        # are only read for their price and are not locked.
+        lines = db.session.execute(
+            select(
+                CartItem.id, CartItem.product_id, CartItem.quantity,
+                Product.name, Product.image, Product.price, Product.category_id,
+                User.username,
+            )
+            .join(Product, CartItem.product_id == Product.id)
+            .join(User, CartItem.user_id == User.id)
+            .where(CartItem.user_id == user_id)
+            .order_by(CartItem.id)
+            .with_for_update(of=CartItem)
+        ).all()
+        if not lines:
+            db.session.rollback()
             return jsonify({'error': 'Cart is empty'}), 400
 
-        total_price = sum(item.product.price * item.quantity for item in cart_items)
-        
-        shipping_cost = float(data.get('shipping_info', {}).get('shipping', 0))
-        total_price += shipping_cost
-
-        order = Order(
-            user_id=user_id,
-            shipping_info=data['shipping_info'],
-            total_price=total_price,
-            status='pending'  
-        )
-        db.session.add(order)
-        db.session.flush()  
-
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price_at_order=cart_item.product.price
-            )
-            db.session.add(order_item)
+        subtotal = sum(line.price * line.quantity for line in lines)
+        total_price = subtotal + shipping_cost
+        created_at = datetime.utcnow()
+
+        order_id = db.session.execute(
+            insert(Order).values(
+                user_id=user_id,
+                created_at=created_at,
+                updated_at=created_at,
+                shipping_info=shipping_info,
+                total_price=total_price,
+                subtotal=subtotal,
+                shipping_cost=shipping_cost,
+                item_count=len(lines),
+                status='pending',
+            ).returning(Order.id)
+        ).scalar_one()
+
+        db.session.execute(insert(OrderItem), [
+            {
+                'order_id': order_id,
+                'product_id': line.product_id,
+                'quantity': line.quantity,
+                'price_at_order': line.price,
+                'name_at_order': line.name,
+                'category_id_at_order': line.category_id,
+            }
+            for line in lines
+        ])
 
         invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
-        invoice = Invoice(
+        invoice_id = db.session.execute(insert(Invoice).values(
             invoice_number=invoice_number,
-            order_id=order.id,
-            pdf_url=f"/invoices/{order.id}.pdf"
+            order_id=order_id,
+            issued_at=created_at,
+            pdf_url=f"/orders/{order_id}/invoice.pdf",
+        ).returning(Invoice.id)).scalar_one()
+
+        db.session.execute(
+            delete(CartItem)
+            .where(CartItem.id.in_([line.id for line in lines]))
+            .execution_options(synchronize_session=False)
         )
-        db.session.add(invoice)
-
-        CartItem.query.filter_by(user_id=user_id).delete()
 
         db.session.commit()
-        
- 
+        store.discard(user_id, [line.product_id for line in lines])
+        invalidate_cart_summary(user_id)
+        record_order_lines(
+            order_id, created_at.date(),
+            [(line.product_id, line.category_id, line.quantity, line.price) for line in lines],
+        )
+        record_sales([(line.product_id, line.quantity) for line in lines])
+
+        try:
+            render_invoice(invoice_id, invoice_document(
+                invoice_number, order_id, created_at, shipping_info,
+                [(line.name, line.quantity, line.price) for line in lines],
+                subtotal, shipping_cost, total_price,
+            ))
+        except Exception as render_error:
+            logger.warning(f"Failed to queue invoice rendering: {str(render_error)}")
+
+        items = [
+            {
+                "id": line.product_id,
+                "name": line.name,
+                "image": line.image,
+                "quantity": line.quantity,
+                "price": float(line.price),
+            }
+            for line in lines
+        ]
+
         try:
             send_order_confirmation_email(
-                name=f"{order.shipping_info.get('firstName', '')} {order.shipping_info.get('lastName', '')}".strip(),
-                email=order.shipping_info.get('email', ''),
+                name=f"{shipping_info.get('firstName', '')} {shipping_info.get('lastName', '')}".strip(),
+                email=shipping_info.get('email', ''),
                 order={
-                    "id": order.id,
-                    "invoice_number": invoice.invoice_number,
-                    "total": order.total_price,
+                    "id": order_id,
+                    "invoice_number": invoice_number,
+                    "total": total_price,
                     "shippingInfo": {
-                        "firstName": order.shipping_info.get('firstName', ''),
-                        "lastName": order.shipping_info.get('lastName', ''),
-                        "city": order.shipping_info.get('city', ''),
+                        "firstName": shipping_info.get('firstName', ''),
+                        "lastName": shipping_info.get('lastName', ''),
+                        "city": shipping_info.get('city', ''),
                     },
                     "items": [
-                        {
-                            "name": item.product.name,
-                            "quantity": item.quantity,
-                            "price": item.price_at_order
-                        }
-                        for item in order.order_items
+                        {"name": item["name"], "quantity": item["quantity"], "price": item["price"]}
+                        for item in items
                     ]
                 }
             )
         except Exception as email_error:
             logger.warning(f"Failed to send confirmation email: {str(email_error)}")
-        
-        order_dict = order.to_dict()
-        order_dict.update({
-            'id': order.id,
-            'userId': order.user_id,
-            'status': order.status.lower(),
-            'createdAt': order.created_at.isoformat(),
-            'total_price': float(order.total_price),
-            'total': float(order.total_price),
-            'shippingInfo': order.shipping_info,
-            'shipping_info': order.shipping_info,
-        })
-        
+
+        order_dict = {
+            'id': order_id,
+            'userId': user_id,
+            'user': lines[0].username,
+            'createdAt': created_at.isoformat(),
+            'status': 'pending',
+            'subtotal': float(subtotal),
+            'shipping': shipping_cost,
+            'itemCount': len(lines),
+            'total': float(total_price),
+            'total_price': float(total_price),
+            'shippingInfo': shipping_info,
+            'shipping_info': shipping_info,
+            'items': items,
+        }
+
         return jsonify({
             'message': 'Order placed successfully',
             'order': order_dict,
@@ -287,32 +520,8 @@ def get_order_invoice(order_id):
         if not invoice:
             return jsonify({'error': 'Invoice not found'}), 404
 
-        invoice_data = {
-            'invoice_number': invoice.invoice_number,
-            'order_id': order.id,
-            'date': order.created_at.isoformat(),
-            'customer': {
-                'name': f"{order.shipping_info.get('firstName', '')} {order.shipping_info.get('lastName', '')}",
-                'email': order.shipping_info.get('email', '')
-            },
-            'shipping_address': {
-                'city': order.shipping_info.get('city', ''),
-                'county': order.shipping_info.get('county', '')
-            },
-            'items': [
-                {
-                    'name': item.product.name,
-                    'quantity': item.quantity,
-                    'price': float(item.price_at_order),
-                    'total': float(item.price_at_order * item.quantity)
-                }
-                for item in order.order_items
-            ],
-            'subtotal': float(sum(item.price_at_order * item.quantity for item in order.order_items)),
-            'shipping': float(order.shipping_info.get('shipping', 0)),
-            'total': float(order.total_price),
-            'status': order.status.lower()
-        }
+        invoice_data = order_invoice_document(order, invoice)
+        invoice_data['status'] = order.status.lower()
 
         return jsonify(invoice_data), 200
 
@@ -321,6 +530,56 @@ def get_order_invoice(order_id):
         return jsonify({'error': 'Failed to generate invoice'}), 500
 
 
+@order_bp.route('/<int:order_id>/invoice.pdf', methods=['GET'])
+@jwt_required()
+def get_order_invoice_pdf(order_id):
+    try:
+        user_id = get_current_user_id()
+        if user_id is None:
+            return jsonify({'error': 'Invalid token or user not authenticated'}), 401
+
+        user = User.query.get(user_id)
+        if user.role == 'admin':
+            order = Order.query.get(order_id)
+        else:
+            order = Order.query.filter_by(id=order_id, user_id=user_id).first()
+
+        if not order:
+            return jsonify({'error': 'Order not found'}), 404
+
+        invoice = Invoice.query.filter_by(order_id=order_id).first()
+        if not invoice:
+            return jsonify({'error': 'Invoice not found'}), 404
+
+        path = cached_pdf(invoice.pdf_digest)
+        if path is None:
+            # Not rendered yet (or not on this host): wait for the renderer
+            digest = render_invoice(invoice.id, order_invoice_document(order, invoice)).result(
+                timeout=current_app.config.get('INVOICE_RENDER_TIMEOUT', 30)
+            )
+            path = cached_pdf(digest)
+        else:
+            digest = invoice.pdf_digest
+
+        # Issued invoices never change, so the digest is a strong ETag
+        response = send_file(
+            path,
+            mimetype='application/pdf',
+            download_name=f"{invoice.invoice_number}.pdf",
+            conditional=True,
+            etag=digest,
+            max_age=31536000,
+        )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+        return response
+
+    except Exception as e:
+        logger.error(f"Error serving invoice PDF: {str(e)}")
+        return jsonify({'error': 'Failed to generate invoice'}), 500
+
+
 @order_bp.route('/<int:order_id>/status', methods=['PUT', 'PATCH'])
 @jwt_required()
 def update_order_status(order_id):
@@ -342,17 +601,28 @@ def update_order_status(order_id):
 
 
         new_status = data['status'].lower()
-        valid_statuses = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
         
-        if new_status not in valid_statuses:
-            return jsonify({'error': 'Invalid status', 'valid_statuses': valid_statuses}), 400
+        if new_status not in VALID_STATUSES:
+            return jsonify({'error': 'Invalid status', 'valid_statuses': VALID_STATUSES}), 400
 
-        order = Order.query.get(order_id)
+        order = db.session.get(Order, order_id, with_for_update=True)
         if not order:
             return jsonify({'error': 'Order not found'}), 404
 
+        # Cancelled orders are left out of the sales rollups and rankings
+        was_cancelled = (order.status or '').lower() == 'cancelled'
+        sign = 0
+        if new_status == 'cancelled' and not was_cancelled:
+            sign = -1
+        elif was_cancelled and new_status != 'cancelled':
+            sign = 1
+        lines = orders_lines([order.id]) if sign else []
+
         order.status = new_status
         db.session.commit()
+        if lines:
+            record_orders(lines, sign)
+            record_sales([(line[2], sign * line[4]) for line in lines])
 
 
         order_dict = order.to_dict()
@@ -375,4 +645,87 @@ def update_order_status(order_id):
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error updating order status: {str(e)}")
-        return jsonify({'error': 'Failed to update status'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to update status'}), 500
+
+@order_bp.route('/status', methods=['PATCH'])
+@jwt_required()
+def bulk_update_order_status():
+    try:
+        user_id = get_current_user_id()
+        if user_id is None:
+            return jsonify({'error': 'Invalid token or user not authenticated'}), 401
+
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        if user.role != 'admin':
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        data = request.get_json(silent=True) or {}
+        new_status = str(data.get('status', '')).lower()
+        order_ids = data.get('order_ids')
+        if new_status not in VALID_STATUSES:
+            return jsonify({'error': 'Invalid status', 'valid_statuses': VALID_STATUSES}), 400
+        if not isinstance(order_ids, list) or not order_ids:
+            return jsonify({'error': 'order_ids must be a non-empty list'}), 400
+        if len(order_ids) > MAX_BULK_STATUS_UPDATES:
+            return jsonify({'error': f'At most {MAX_BULK_STATUS_UPDATES} orders per request'}), 400
+        if not all(isinstance(order_id, int) and not isinstance(order_id, bool) for order_id in order_ids):
+            return jsonify({'error': 'order_ids must be integers'}), 400
+        order_ids = list(dict.fromkeys(order_ids))
+
+        from_statuses = [status for status, targets in ORDER_TRANSITIONS.items() if new_status in targets]
+        updated = db.session.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status.in_(from_statuses))
+            .values(status=new_status)
+            .returning(Order.id, Order.shipping_info)
+            .execution_options(synchronize_session=False)
+        ).all()
+        updated_ids = {row.id for row in updated}
+
+        # Moving into 'cancelled' is the only bulk transition that changes sales
+        lines = orders_lines(list(updated_ids)) if new_status == 'cancelled' else []
+
+        # Explain the ids that were left alone
+        results = {order_id: 'updated' for order_id in updated_ids}
+        skipped = [order_id for order_id in order_ids if order_id not in updated_ids]
+        current = dict(
+            db.session.query(Order.id, Order.status).filter(Order.id.in_(skipped))
+        ) if skipped else {}
+        for order_id in skipped:
+            if order_id not in current:
+                results[order_id] = 'not_found'
+            elif (current[order_id] or '').lower() == new_status:
+                results[order_id] = 'unchanged'
+            else:
+                results[order_id] = f"invalid_transition:{(current[order_id] or '').lower()}"
+
+        db.session.commit()
+        if lines:
+            record_orders(lines, -1)
+            record_sales([(line[2], -line[4]) for line in lines])
+
+        try:
+            send_order_status_emails([
+                {
+                    'name': f"{(row.shipping_info or {}).get('firstName', '')} {(row.shipping_info or {}).get('lastName', '')}".strip(),
+                    'email': (row.shipping_info or {}).get('email', ''),
+                    'order_id': row.id,
+                    'status': new_status,
+                }
+                for row in updated
+            ])
+        except Exception as email_error:
+            logger.warning(f"Failed to queue status emails: {str(email_error)}")
+
+        return jsonify({
+            'status': new_status,
+            'updated': len(updated_ids),
+            'results': {str(order_id): results[order_id] for order_id in order_ids},
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating order statuses: {str(e)}")
+        return jsonify({'error': 'Failed to update statuses'}), 500
@@ -0,0 +1,125 @@
+import io
+import csv
+import json
+from sqlalchemy import select
+from models import db, User, Product, Order, OrderItem, Invoice
+
+FETCH_SIZE = 1000
+CHUNK_BYTES = 64 * 1024
+
+CSV_COLUMNS = [
+    "order_id", "invoice_number", "created_at", "status", "username", "email",
+    "first_name", "last_name", "city", "county",
+    "product_id", "product_name", "quantity", "unit_price", "line_total",
+    "order_subtotal", "shipping_cost", "order_total",
+]
+
+
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _text(value):
+    """A free-text cell, defused so spreadsheets don't evaluate it as a formula."""
+    value = "" if value is None else str(value)
+    return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+
+
+def export_rows(filters):
+    """Order lines (one per item, one for an order without items) in
+    ``(created_at, id)`` order, fetched FETCH_SIZE at a time from a
+    server-side cursor."""
+    statement = (
+        select(
+            Order.id, Order.created_at, Order.status, Order.shipping_info,
+            Order.subtotal, Order.shipping_cost, Order.total_price,
+            Invoice.invoice_number, User.username, User.email,
+            OrderItem.product_id, Product.name, OrderItem.quantity, OrderItem.price_at_order,
+        )
+        .select_from(Order)
+        .outerjoin(User, Order.user_id == User.id)
+        .outerjoin(Invoice, Invoice.order_id == Order.id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Product, OrderItem.product_id == Product.id)
+        .where(*filters)
+        .order_by(Order.created_at, Order.id, OrderItem.id)
+        .execution_options(yield_per=FETCH_SIZE)
+    )
+    return db.session.execute(statement)
+
+
+def _chunks(pieces):
+    # Coalesce small writes so the server isn't flushing per row
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _csv_lines(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def line(values):
+        writer.writerow(values)
+        value = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return value
+
+    yield line(CSV_COLUMNS)
+    for row in rows:
+        info = row.shipping_info or {}
+        has_item = row.quantity is not None
+        yield line([
+            row.id, _text(row.invoice_number), row.created_at.isoformat() if row.created_at else "",
+            _text((row.status or "").lower()), _text(row.username), _text(row.email),
+            _text(info.get("firstName")), _text(info.get("lastName")),
+            _text(info.get("city")), _text(info.get("county")),
+            row.product_id if has_item else "", _text(row.name or "Unknown Product") if has_item else "",
+            row.quantity if has_item else "",
+            f"{row.price_at_order:.2f}" if has_item else "",
+            f"{row.price_at_order * row.quantity:.2f}" if has_item else "",
+            f"{row.subtotal:.2f}", f"{row.shipping_cost:.2f}", f"{row.total_price:.2f}",
+        ])
+
+
+def _ndjson_lines(rows):
+    # Rows arrive grouped by order, so each order is emitted once its last line is seen
+    current = None
+    for row in rows:
+        if current is None or current["id"] != row.id:
+            if current is not None:
+                yield json.dumps(current, separators=(",", ":")) + "\n"
+            current = {
+                "id": row.id,
+                "invoiceNumber": row.invoice_number,
+                "createdAt": row.created_at.isoformat() if row.created_at else None,
+                "status": (row.status or "").lower(),
+                "user": row.username,
+                "email": row.email,
+                "shippingInfo": row.shipping_info or {},
+                "subtotal": float(row.subtotal),
+                "shipping": float(row.shipping_cost),
+                "total": float(row.total_price),
+                "items": [],
+            }
+        if row.quantity is not None:
+            current["items"].append({
+                "id": row.product_id,
+                "name": row.name or "Unknown Product",
+                "quantity": row.quantity,
+                "price": float(row.price_at_order),
+            })
+    if current is not None:
+        yield json.dumps(current, separators=(",", ":")) + "\n"
+
+
+def export_orders(filters, fmt):
+    """Generator of response chunks for the orders matching ``filters``."""
+    lines = _csv_lines if fmt == "csv" else _ndjson_lines
+    yield from _chunks(lines(export_rows(filters)))
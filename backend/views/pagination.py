@@ -0,0 +1,100 @@
+import base64
+import json
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+
+
+def cursor_after(token, sort):
+    """Key values to resume from, checking the cursor was issued for ``sort``."""
+    if not token:
+        return None
+    payload = decode_cursor(token)
+    if not isinstance(payload, dict) or payload.get("sort") != sort:
+        raise CursorError("Cursor does not match the requested sort")
+    after = payload.get("after")
+    if not isinstance(after, list) or not all(
+        value is None or isinstance(value, (str, int, float)) and not isinstance(value, bool)
+        for value in after
+    ):
+        raise CursorError("Invalid cursor")
+    return after
+
+
+def next_cursor(sort, last):
+    return encode_cursor({"sort": sort, "after": last}) if last is not None else None
+
+
+def page_size(raw, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if raw is None:
+        return default
+    return max(1, min(raw, maximum))
+
+
+def keyset_order(keys):
+    """ORDER BY clauses for a list of (expression, descending) sort keys."""
+    return [expr.desc() if descending else expr.asc() for expr, descending in keys]
+
+
+def _key_type(expr):
+    try:
+        python_type = expr.type.python_type
+    except (AttributeError, NotImplementedError):
+        return None
+    # JSON numbers come back as int or float whichever the column holds
+    return (int, float) if python_type in (int, float) else python_type
+
+
+def keyset_filter(keys, values):
+    """Row-value seek past ``values`` following the direction of each sort key.
+
+    Expands to ``(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...`` so it works on
+    every backend and lets the planner use the matching composite index.
+    """
+    clauses = []
+    for i, (expr, descending) in enumerate(keys):
+        equal = [keys[j][0] == values[j] for j in range(i)]
+        step = expr < values[i] if descending else expr > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def keyset_page(query, keys, limit, after=None, row_values=None):
+    """Fetch one page of ``query`` ordered by ``keys``.
+
+    ``after`` is the decoded list of key values from the previous page and
+    ``row_values`` maps a result row to its key values. Returns the rows and
+    the key values to resume from, or ``None`` on the last page.
+    """
+    if after is not None:
+        if len(after) != len(keys):
+            raise CursorError("Invalid cursor")
+        for (expr, _), value in zip(keys, after):
+            expected = _key_type(expr)
+            if value is not None and expected is not None and not isinstance(value, expected):
+                raise CursorError("Invalid cursor")
+        query = query.filter(keyset_filter(keys, after))
+
+    rows = query.order_by(*keyset_order(keys)).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, row_values(rows[-1])
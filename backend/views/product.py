@@ -1,38 +1,107 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import contains_eager
 from models import db, Product, Category
+from views.search import apply_search
+from views.product_import import ImportAborted, read_rows, import_products
+from views.bulk import update_by_id
+from views.cart_store import cart_store
+from views.facets import parse_facets, product_facets
+from views.rankings import (
+    RANKED_LISTS, MAX_RANKED, category_id_for, ranked_product_ids,
+    product_saved, product_removed, invalidate_rankings
+)
+from views.catalog import (
+    fragment_snapshot, product_fragments, fragments_by_id, invalidate_products, json_response,
+    catalog_cached, bump_catalog_version
+)
+from views.pagination import (
+    CursorError, cursor_after, next_cursor, keyset_order, keyset_page, page_size
+)
 
 product_bp = Blueprint('product', __name__, url_prefix='/products')
 
+SORT_KEYS = {
+    "price-low": [(Product.price, False), (Product.id, False)],
+    "price-high": [(Product.price, True), (Product.id, True)],
+    "rating": [(Product.rating, True), (Product.id, True)],
+    "newest": [(Product.id, True)],
+    "name": [(Product.name, False), (Product.id, False)],
+}
+
+
+def product_sort_values(sort, product):
+    return [getattr(product, expr.key) for expr, _ in SORT_KEYS[sort]]
+
+
 @product_bp.route('/', methods=['GET'])
+@catalog_cached
 def get_products():
     search = request.args.get("search", "", type=str).lower()
     category_name = request.args.get("category", "all", type=str).lower()
     sort = request.args.get("sort", "newest", type=str).lower() 
+    limit = request.args.get("limit", type=int)
 
-    query = Product.query.join(Category)
+    facets = None
+    if request.args.get("facets"):
+        try:
+            requested = parse_facets(request.args["facets"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        facets = product_facets(search, category_name, requested)
+
+    snapshot = fragment_snapshot()
+    query = Product.query.join(Category).options(contains_eager(Product.category))
 
     if category_name != "all":
         query = query.filter(Category.name.ilike(category_name))
 
+    rank_key = None
     if search:
-        query = query.filter(
-            (Product.name.ilike(f"%{search}%")) |
-            (Product.description.ilike(f"%{search}%"))
+        query, rank_key = apply_search(query, search)
+
+    if sort == "relevance" and rank_key is not None:
+        rank, descending = rank_key
+        query = query.add_columns(rank.label("search_rank"))
+        sort_keys = [rank_key, (Product.id, descending)]
+        row_values = lambda row: [row.search_rank, row.Product.id]
+        row_product = lambda row: row.Product
+    else:
+        if sort not in SORT_KEYS:
+            sort = "newest"
+        sort_keys = SORT_KEYS[sort]
+        row_values = lambda p: product_sort_values(sort, p)
+        row_product = lambda p: p
+
+    if limit is None:
+        rows = query.order_by(*keyset_order(sort_keys)).all()
+        products = product_fragments(map(row_product, rows), snapshot)
+        if facets is not None:
+            return json_response({"products": products, "facets": facets})
+        return json_response(products)
+
+    try:
+        after = cursor_after(request.args.get("cursor"), sort)
+
+        total = None
+        if request.args.get("include_total", "false").lower() == "true":
+            total = query.order_by(None).count()
+
+        rows, last = keyset_page(
+            query, sort_keys, page_size(limit), after=after, row_values=row_values
         )
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
 
-    sort_map = {
-        "price-low": Product.price.asc(),
-        "price-high": Product.price.desc(),
-        "rating": Product.rating.desc(),
-        "newest": Product.id.desc(),
-        "name": Product.name.asc(),
+    body = {
+        "products": product_fragments(map(row_product, rows), snapshot),
+        "next_cursor": next_cursor(sort, last),
     }
-    sort_criteria = sort_map.get(sort, Product.id.desc())
-    query = query.order_by(sort_criteria)
-
-    products = query.all()
-    return jsonify([p.to_dict() for p in products])
+    if total is not None:
+        body["total"] = total
+    if facets is not None:
+        body["facets"] = facets
+    return json_response(body)
 
 
 
@@ -62,12 +131,67 @@ def add_product():
     )
 
     db.session.add(new_product)
+    bump_catalog_version()
     db.session.commit()
+    invalidate_products([new_product.id])
+    product_saved(new_product.id, new_product.category_id, new_product.rating)
 
     return jsonify(new_product.to_dict()), 201
 
 
+@product_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_products_route():
+    identity = get_jwt_identity()
+    if identity['role'] not in ['admin', 'manager']:
+        return jsonify({"error": "Permission denied"}), 403
+
+    upload = request.files.get('file')
+    fmt = request.args.get('format')
+    if not fmt:
+        content_type = upload.mimetype if upload else request.mimetype
+        fmt = "csv" if content_type in ("text/csv", "application/csv") else "ndjson"
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    mode = request.args.get('mode', 'insert')
+    if mode not in ("insert", "upsert"):
+        return jsonify({"error": "mode must be insert or upsert"}), 400
+
+    stream = upload.stream if upload else request.stream
+    try:
+        report = import_products(read_rows(stream, fmt), upsert=mode == "upsert")
+    except ImportAborted as e:
+        print("Import error:", str(e.__cause__))
+        return jsonify({"error": str(e), **e.report}), e.status
+    except Exception as e:
+        db.session.rollback()
+        print("Import error:", str(e))
+        return jsonify({"error": "Import failed", "details": str(e)}), 500
+
+    return jsonify(report), 200
+
+
+@product_bp.route('/ranked/<string:name>', methods=['GET'])
+def get_ranked_products(name):
+    if name not in RANKED_LISTS:
+        return jsonify({"error": "Unknown list", "lists": list(RANKED_LISTS)}), 404
+
+    category_id = None
+    category_name = request.args.get("category", "all", type=str)
+    if category_name.lower() != "all":
+        category_id = category_id_for(category_name)
+        if category_id is None:
+            return jsonify({"error": "Category not found"}), 404
+
+    limit = page_size(request.args.get("limit", type=int), default=10, maximum=MAX_RANKED)
+    snapshot = fragment_snapshot()
+    product_ids = ranked_product_ids(name, category_id, limit)
+    return json_response({"list": name, "products": fragments_by_id(product_ids, snapshot)})
+
+
 @product_bp.route('/categories', methods=['GET'])
+@catalog_cached
 def get_categories():
     categories = Category.query.all()
     return jsonify([
@@ -94,12 +218,107 @@ def update_product(id):
     for field in ['name', 'description', 'price', 'in_stock', 'image', 'category_id']:
         if field in data:
             setattr(product, field, data[field])
+    bump_catalog_version()
     db.session.commit()
+    invalidate_products([product.id])
+    product_saved(product.id, product.category_id, product.rating)
     return jsonify(product.to_dict())
 
 
 
 
+BULK_UPDATE_FIELDS = {
+    'price': (int, float),
+    'in_stock': (bool,),
+    'rating': (int, float),
+    'reviews': (int,),
+    'name': (str,),
+    'description': (str, type(None)),
+    'image': (str, type(None)),
+    'category_id': (int,),
+}
+MAX_BULK_UPDATES = 5000
+
+
+def valid_bulk_value(field, value):
+    if isinstance(value, bool) and bool not in BULK_UPDATE_FIELDS[field]:
+        return False
+    if not isinstance(value, BULK_UPDATE_FIELDS[field]):
+        return False
+    return field not in ('price', 'rating', 'reviews') or value >= 0
+
+
+@product_bp.route('/bulk', methods=['PATCH'])
+@jwt_required()
+def bulk_update_products():
+    identity = get_jwt_identity()
+    if identity['role'] not in ['admin', 'manager']:
+        return jsonify({"error": "Permission denied"}), 403
+
+    data = request.get_json()
+    patches = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(patches, list) or not patches:
+        return jsonify({"error": "A non-empty list of updates is required"}), 400
+    if len(patches) > MAX_BULK_UPDATES:
+        return jsonify({"error": f"At most {MAX_BULK_UPDATES} updates per request"}), 400
+
+    # Later patches for the same id win, field by field
+    merged = {}
+    errors = []
+    for index, patch in enumerate(patches):
+        if not isinstance(patch, dict) or type(patch.get('id')) is not int:
+            errors.append({"index": index, "error": "id must be an integer"})
+            continue
+        fields = {k: v for k, v in patch.items() if k != 'id'}
+        unknown = [k for k in fields if k not in BULK_UPDATE_FIELDS]
+        if unknown:
+            errors.append({"index": index, "error": f"Unsupported fields: {', '.join(unknown)}"})
+            continue
+        invalid = [k for k, v in fields.items() if not valid_bulk_value(k, v)]
+        if invalid:
+            errors.append({"index": index, "error": f"Invalid values for: {', '.join(invalid)}"})
+            continue
+        if not fields:
+            errors.append({"index": index, "error": "No fields to update"})
+            continue
+        merged.setdefault(patch['id'], {}).update(fields)
+
+    category_ids = {f['category_id'] for f in merged.values() if 'category_id' in f}
+    if category_ids:
+        known = {c for (c,) in db.session.query(Category.id).filter(Category.id.in_(category_ids))}
+        for product_id, fields in merged.items():
+            if 'category_id' in fields and fields['category_id'] not in known:
+                errors.append({"id": product_id, "error": f"Unknown category_id {fields['category_id']}"})
+
+    if errors:
+        return jsonify({"error": "Invalid updates", "errors": errors}), 400
+
+    # One set-based statement per distinct combination of patched fields
+    groups = {}
+    for product_id, fields in merged.items():
+        groups.setdefault(tuple(sorted(fields)), []).append({"id": product_id, **fields})
+
+    try:
+        updated = []
+        for fields, rows in groups.items():
+            updated.extend(update_by_id(Product, rows, fields))
+        if updated:
+            bump_catalog_version()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print("Bulk update error:", str(e))
+        return jsonify({"error": "Bulk update failed", "details": str(e)}), 500
+
+    invalidate_products(updated)
+    invalidate_rankings()
+    updated_ids = set(updated)
+    return jsonify({
+        "updated": len(updated_ids),
+        "missing": sorted(set(merged) - updated_ids),
+    }), 200
+
+
 @product_bp.route('/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete_product(id):
@@ -115,7 +334,11 @@ def delete_product(id):
 
         product = Product.query.get_or_404(id)
         db.session.delete(product)
+        bump_catalog_version()
         db.session.commit()
+        invalidate_products([id])
+        product_removed(id)
+        cart_store().forget_products([id])
         return jsonify({"message": "Product deleted"}), 200
 
     except Exception as e:
@@ -0,0 +1,223 @@
+import csv
+import json
+import time
+from sqlalchemy import insert, text
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Product, Category
+from views.bulk import BATCH_SIZE, chunked, dialect_insert
+from views.catalog import bump_catalog_version, invalidate_catalog
+from views.rankings import invalidate_rankings
+
+MAX_REPORTED_ERRORS = 500
+TRUE_VALUES = ("true", "1", "yes", "y")
+FALSE_VALUES = ("false", "0", "no", "n")
+UPSERT_COLUMNS = ("name", "price", "image", "description", "in_stock", "rating", "reviews", "category_id")
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportAborted(Exception):
+    """The upload broke off part way; ``report`` covers what was committed before."""
+
+    def __init__(self, message, report, status):
+        super().__init__(message)
+        self.report = report
+        self.status = status
+
+
+def _decode(number, line):
+    # Excel and Notepad start UTF-8 files with a byte order mark
+    return line.decode("utf-8-sig" if number == 1 else "utf-8")
+
+
+def read_rows(stream, fmt):
+    """Yield ``(row_number, raw_row)`` pairs without buffering the upload.
+
+    Lines are decoded one at a time, so bad bytes only affect the row they are in.
+    """
+    if fmt == "csv":
+        lines = (_decode(number, line) for number, line in enumerate(stream, start=1))
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+        return
+
+    for number, line in enumerate(stream, start=1):
+        try:
+            line = _decode(number, line).strip()
+        except UnicodeDecodeError:
+            yield number, RowError("Row must be UTF-8 encoded")
+            continue
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, RowError("Invalid JSON")
+
+
+def load_category_map():
+    by_name, ids = {}, set()
+    for category_id, name in db.session.query(Category.id, Category.name):
+        by_name[name.lower()] = category_id
+        ids.add(category_id)
+    return by_name, ids
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _number(raw, field, cast, default=None):
+    value = raw.get(field)
+    if _blank(value):
+        if default is None:
+            raise RowError(f"{field} is required")
+        return default
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be a number")
+    if value < 0:
+        raise RowError(f"{field} must not be negative")
+    return value
+
+
+def _boolean(raw):
+    value = raw.get("in_stock", raw.get("inStock"))
+    if _blank(value):
+        return True
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError("in_stock must be true or false")
+
+
+def validate_row(raw, categories):
+    if isinstance(raw, RowError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RowError("Row must be an object")
+
+    name = raw.get("name")
+    if _blank(name):
+        raise RowError("name is required")
+    name = str(name).strip()
+    if len(name) > 120:
+        raise RowError("name is longer than 120 characters")
+
+    by_name, ids = categories
+    if not _blank(raw.get("category_id")):
+        try:
+            category_id = int(raw["category_id"])
+        except (TypeError, ValueError):
+            raise RowError("category_id must be an integer")
+        if category_id not in ids:
+            raise RowError(f"Unknown category_id {category_id}")
+    elif not _blank(raw.get("category")):
+        category_id = by_name.get(str(raw["category"]).strip().lower())
+        if category_id is None:
+            raise RowError(f"Unknown category '{raw['category']}'")
+    else:
+        raise RowError("category or category_id is required")
+
+    values = {
+        "name": name,
+        "price": _number(raw, "price", float),
+        "image": raw.get("image") or None,
+        "description": raw.get("description") or None,
+        "in_stock": _boolean(raw),
+        "rating": _number(raw, "rating", float, default=0.0),
+        "reviews": _number(raw, "reviews", int, default=0),
+        "category_id": category_id,
+    }
+    if not _blank(raw.get("id")):
+        try:
+            values["id"] = int(raw["id"])
+        except (TypeError, ValueError):
+            raise RowError("id must be an integer")
+    return values
+
+
+def _write_batch(batch, upsert):
+    if not upsert:
+        for row in batch:
+            row.pop("id", None)
+    new_rows = [row for row in batch if "id" not in row]
+    keyed_rows = [row for row in batch if "id" in row]
+
+    if new_rows:
+        db.session.execute(insert(Product), new_rows)
+    if keyed_rows:
+        statement = dialect_insert(Product)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Product.id],
+            set_={column: getattr(statement.excluded, column) for column in UPSERT_COLUMNS},
+        )
+        db.session.execute(statement, keyed_rows)
+        if db.engine.dialect.name == "postgresql":
+            # Explicit ids bypass the serial sequence; keep it ahead of them
+            db.session.execute(text(
+                "SELECT setval(pg_get_serial_sequence('products', 'id'), "
+                "(SELECT max(id) FROM products))"
+            ))
+    bump_catalog_version()
+    db.session.commit()
+
+
+def import_products(rows, upsert=False):
+    """Validate and write ``rows`` in batches of BATCH_SIZE, one transaction each.
+
+    With ``upsert`` rows carrying an ``id`` update that product (or create it);
+    otherwise every row is inserted as a new product. If the upload breaks
+    off, ImportAborted carries the report for the batches already committed.
+    """
+    started = time.perf_counter()
+    categories = load_category_map()
+    report = {"rows": 0, "imported": 0, "error_count": 0, "errors": []}
+    failure = None
+
+    def valid_rows():
+        nonlocal failure
+        number = 0
+        try:
+            for number, raw in rows:
+                report["rows"] += 1
+                try:
+                    yield number, validate_row(raw, categories)
+                except RowError as e:
+                    report["error_count"] += 1
+                    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                        report["errors"].append({"row": number, "error": str(e)})
+        except UnicodeDecodeError as e:
+            # Raised while reading a CSV, so the row after the last one read is
+            # at fault; rows before it are still written
+            failure = ({"row": number + 1, "error": "Upload must be UTF-8 encoded"}, 400, e)
+
+    try:
+        for batch in chunked(valid_rows(), BATCH_SIZE):
+            try:
+                _write_batch([values for _, values in batch], upsert)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                failure = ({"row": batch[0][0], "error": "Batch starting at this row could not be written"}, 500, e)
+                break
+            report["imported"] += len(batch)
+    finally:
+        if report["imported"]:
+            invalidate_catalog()
+            invalidate_rankings()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_ms"] = round(elapsed * 1000, 1)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else None
+    if failure:
+        # Earlier batches stay committed; report them along with where it stopped
+        report["failed"], status, cause = failure
+        raise ImportAborted(report["failed"]["error"], report, status) from cause
+    return report
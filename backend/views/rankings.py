@@ -0,0 +1,180 @@
+import time
+import bisect
+import heapq
+import threading
+from flask import current_app
+from sqlalchemy import func
+from models import db, Product, Category, Order, OrderItem
+from views.catalog import catalog_version
+
+RANKED_LISTS = ("top-rated", "newest", "bestsellers")
+MAX_RANKED = 100
+
+# In-memory top-MAX_RANKED lists per (list, category_id), category None being
+# the whole catalog. Entries are (rank key, product_id) kept in ascending rank
+# key order, so the best product is first and a top-k read is a slice.
+_lists = {}
+# Units sold per product (cancelled orders excluded) and the category of each
+# sold product; bestseller lists are rebuilt from these without SQL.
+_units = None
+_product_categories = None
+_units_loaded_at = 0.0
+_category_ids = {}
+_category_version = None
+_lock = threading.RLock()
+
+
+class RankedList:
+    def __init__(self, entries):
+        self.entries = entries
+        self.built_at = time.monotonic()
+        self.dirty = False
+
+
+def _rank_key(name, product_id, value):
+    # Negated so that ascending order is best-first, ties going to newer ids
+    if name == "newest":
+        return (-product_id,)
+    return (-value, -product_id)
+
+
+def _load_units():
+    global _units, _product_categories, _units_loaded_at
+    rows = (
+        db.session.query(OrderItem.product_id, Product.category_id, func.sum(OrderItem.quantity))
+        .join(Product, OrderItem.product_id == Product.id)
+        .join(Order, OrderItem.order_id == Order.id)
+        .filter(Order.status != "cancelled")
+        .group_by(OrderItem.product_id, Product.category_id)
+        .all()
+    )
+    _units = {product_id: int(units) for product_id, _, units in rows}
+    _product_categories = {product_id: category_id for product_id, category_id, _ in rows}
+    _units_loaded_at = time.monotonic()
+
+
+def _build(name, category_id):
+    if name == "bestsellers":
+        candidates = (
+            (units, product_id) for product_id, units in _units.items()
+            if units > 0 and (category_id is None or _product_categories.get(product_id) == category_id)
+        )
+        top = heapq.nlargest(MAX_RANKED, candidates)
+        return RankedList([(_rank_key(name, pid, units), pid) for units, pid in top])
+
+    if name == "top-rated":
+        query = db.session.query(Product.id, Product.rating).order_by(Product.rating.desc(), Product.id.desc())
+    else:
+        query = db.session.query(Product.id, Product.id).order_by(Product.id.desc())
+    if category_id is not None:
+        query = query.filter(Product.category_id == category_id)
+    rows = query.limit(MAX_RANKED).all()
+    return RankedList([(_rank_key(name, pid, value), pid) for pid, value in rows])
+
+
+def category_id_for(name):
+    """Resolve a category name from a map refreshed when the catalog changes."""
+    global _category_ids, _category_version
+    version, _ = catalog_version()
+    if _category_version != version:
+        _category_ids = {n.lower(): cid for cid, n in db.session.query(Category.id, Category.name)}
+        _category_version = version
+    return _category_ids.get(name.lower())
+
+
+def ranked_product_ids(name, category_id=None, k=10):
+    # Writes in this worker are applied incrementally; the TTL bounds how long
+    # changes made by other workers take to show up.
+    ttl = current_app.config.get("RANKINGS_TTL", 300)
+    now = time.monotonic()
+    key = (name, category_id)
+    with _lock:
+        if name == "bestsellers" and (_units is None or now - _units_loaded_at >= ttl):
+            # Periodic resync picks up sales recorded by other workers
+            _load_units()
+            for (list_name, _), ranked in _lists.items():
+                if list_name == "bestsellers":
+                    ranked.dirty = True
+
+        ranked = _lists.get(key)
+        if ranked is None or ranked.dirty or now - ranked.built_at >= ttl:
+            ranked = _lists[key] = _build(name, category_id)
+        return [pid for _, pid in ranked.entries[:k]]
+
+
+def _place(ranked, product_id, rank_key):
+    entries = ranked.entries
+    full = len(entries) >= MAX_RANKED
+    index = next((i for i, (_, pid) in enumerate(entries) if pid == product_id), None)
+    if index is not None:
+        entries.pop(index)
+    if rank_key is None:
+        # Removed: a full list now has a hole only the database can fill
+        ranked.dirty = ranked.dirty or (full and index is not None)
+        return
+    if full and entries and rank_key > entries[-1][0]:
+        if index is not None:
+            # Fell below the cut-off; whatever ranks next is unknown here
+            ranked.dirty = True
+        return
+    bisect.insort(entries, (rank_key, product_id))
+    del entries[MAX_RANKED:]
+
+
+def product_saved(product_id, category_id, rating):
+    """Re-rank a created or edited product in the lists it can appear in."""
+    with _lock:
+        for (name, scope), ranked in _lists.items():
+            if name == "bestsellers":
+                continue
+            if scope is None or scope == category_id:
+                _place(ranked, product_id, _rank_key(name, product_id, rating))
+            else:
+                _place(ranked, product_id, None)
+
+        if _product_categories is not None and product_id in _product_categories:
+            _product_categories[product_id] = category_id
+            for (name, scope), ranked in _lists.items():
+                if name == "bestsellers" and scope is not None:
+                    ranked.dirty = True
+
+
+def product_removed(product_id):
+    with _lock:
+        for ranked in _lists.values():
+            _place(ranked, product_id, None)
+        if _units is not None:
+            _units.pop(product_id, None)
+            _product_categories.pop(product_id, None)
+
+
+def record_sales(lines):
+    """Apply ``(product_id, quantity)`` lines of a placed order.
+
+    Cancellations pass negative quantities. Units are bucketed by each
+    product's current category, as in ``_load_units``, not the one it had
+    when the order was placed.
+    """
+    with _lock:
+        if _units is None:
+            return
+        unknown = {product_id for product_id, _ in lines if product_id not in _product_categories}
+        if unknown:
+            _product_categories.update(
+                db.session.query(Product.id, Product.category_id).filter(Product.id.in_(unknown))
+            )
+        for product_id, quantity in lines:
+            category_id = _product_categories.get(product_id)
+            units = _units.get(product_id, 0) + quantity
+            _units[product_id] = units
+            for scope in {None, category_id}:
+                ranked = _lists.get(("bestsellers", scope))
+                if ranked is not None:
+                    _place(ranked, product_id, _rank_key("bestsellers", product_id, units) if units > 0 else None)
+
+
+def invalidate_rankings():
+    """Bulk catalog changes: rebuild every list on its next read."""
+    with _lock:
+        for ranked in _lists.values():
+            ranked.dirty = True
@@ -0,0 +1,77 @@
+import time
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func
+from models import db, TokenBlocklist
+
+# Revoked jtis known to this worker, with when they were revoked. Tokens are
+# only checked against this map. Other workers' logouts are picked up by
+# polling the blocklist for ids above the highest one seen, at most once per
+# REVOCATION_POLL_INTERVAL seconds; a row whose id was allocated before, but
+# committed after, a higher one is caught by re-reading every unexpired
+# revocation once per REVOCATION_RESCAN_INTERVAL seconds.
+_revoked = {}
+_last_id = None
+_checked_at = 0.0
+_scanned_at = 0.0
+_lock = threading.Lock()
+
+
+def _token_lifetime():
+    expires = current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES', timedelta(minutes=15))
+    return expires if isinstance(expires, timedelta) else None
+
+
+def _refresh():
+    global _last_id, _checked_at, _scanned_at
+    now = datetime.utcnow()
+    lifetime = _token_lifetime()
+    rescan = current_app.config.get('REVOCATION_RESCAN_INTERVAL', 60.0)
+    statement = select(TokenBlocklist.id, TokenBlocklist.jti, TokenBlocklist.created_at)
+
+    full = _last_id is None or time.monotonic() - _scanned_at >= rescan
+    if full:
+        # Read the high-water mark first, so nothing committed between the two
+        # queries can fall below it unseen
+        last_id = db.session.scalar(select(func.max(TokenBlocklist.id))) or 0
+        if lifetime is not None:
+            # Tokens revoked longer ago than they live have expired anyway
+            statement = statement.where(TokenBlocklist.created_at >= now - lifetime)
+    else:
+        last_id = _last_id
+        statement = statement.where(TokenBlocklist.id > _last_id)
+    rows = db.session.execute(statement).all()
+
+    for row_id, jti, created_at in rows:
+        _revoked[jti] = created_at.replace(tzinfo=None) if created_at else now
+        last_id = max(last_id, row_id)
+    if lifetime is not None:
+        for jti, created_at in list(_revoked.items()):
+            if created_at < now - lifetime:
+                del _revoked[jti]
+
+    _last_id = max(last_id, _last_id or 0)
+    _checked_at = time.monotonic()
+    if full:
+        _scanned_at = _checked_at
+
+
+def is_revoked(jti):
+    """Whether ``jti`` has been logged out; the blocklist is polled, not queried per token."""
+    interval = current_app.config.get('REVOCATION_POLL_INTERVAL', 1.0)
+    if _last_id is None or time.monotonic() - _checked_at >= interval:
+        # Only one thread polls; the rest answer from what is already loaded
+        if _lock.acquire(blocking=_last_id is None):
+            try:
+                if _last_id is None or time.monotonic() - _checked_at >= interval:
+                    _refresh()
+            finally:
+                _lock.release()
+    return jti in _revoked
+
+
+def revoke(jti, revoked_at):
+    """Record a logout committed by this worker so it takes effect here at once."""
+    with _lock:
+        _revoked[jti] = revoked_at.replace(tzinfo=None)
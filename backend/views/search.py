@@ -0,0 +1,85 @@
+import re
+import logging
+from sqlalchemy import Float, cast, select, func, literal_column, text
+from models import db, Product
+
+logger = logging.getLogger(__name__)
+
+# The text index itself is created by the 7e1f4a9c0b52 migration: a generated
+# tsvector column on Postgres, a trigger-maintained FTS5 table on SQLite.
+SQLITE_TRIGGERS = ("products_fts_ai", "products_fts_ad", "products_fts_au")
+
+_index_ready = False
+
+
+def search_terms(search):
+    return re.findall(r"\w+", search.lower())
+
+
+def search_index_ready():
+    """Whether the migrated text index is present. Cheap once it has been found."""
+    global _index_ready
+    if _index_ready:
+        return True
+
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        _index_ready = db.session.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'products' AND column_name = 'search_vector'"
+        )).first() is not None
+    elif dialect == "sqlite":
+        # Triggers vanish when products is dropped and recreated (seed.py),
+        # leaving the FTS content stale, so all of them must be present
+        triggers = db.session.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (:a, :d, :u)"
+        ), dict(zip("adu", SQLITE_TRIGGERS))).scalar()
+        _index_ready = triggers == len(SQLITE_TRIGGERS)
+    return _index_ready
+
+
+def apply_search(query, search):
+    """Restrict a Product query to ``search`` matches.
+
+    Returns the filtered query and a ``(rank, descending)`` sort key that
+    orders rows by relevance, or ``None`` when the backend has no text index.
+    Every term is prefix-matched so partial words from the search box hit.
+    """
+    terms = search_terms(search)
+    if not terms:
+        return query, None
+
+    try:
+        indexed = search_index_ready()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Full-text index unavailable, falling back to LIKE: {str(e)}")
+        indexed = False
+
+    dialect = db.engine.dialect.name
+    if indexed and dialect == "postgresql":
+        ts_query = func.to_tsquery("english", " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column("products.search_vector")
+        query = query.filter(vector.op("@@")(ts_query))
+        # ts_rank_cd is float4; widen it so the rank survives the JSON round
+        # trip through the keyset cursor and still equals the row's own value
+        return query, (cast(func.ts_rank_cd(vector, ts_query), Float), True)
+
+    if indexed and dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        fts = (
+            select(literal_column("rowid").label("product_id"), literal_column("rank").label("rank"))
+            .select_from(text("products_fts"))
+            .where(literal_column("products_fts").op("MATCH")(match))
+            .subquery("fts")
+        )
+        query = query.join(fts, fts.c.product_id == Product.id)
+        # bm25 scores are negative, best match first in ascending order
+        return query, (fts.c.rank, False)
+
+    for term in terms:
+        query = query.filter(
+            (Product.name.ilike(f"%{term}%")) |
+            (Product.description.ilike(f"%{term}%"))
+        )
+    return query, None